@@ -0,0 +1,104 @@
+"""Benchmark the logging overhead of resolving a large lockfile
+
+Resolves a synthetic lockfile with thousands of packages, some of which are excluded by their
+markers, with debug logging disabled. Resolution is timed with the plugin's logger, with a logger
+that formats every message before checking whether it will be emitted (as the plugin's logger
+did previously), and with logging removed entirely to give the baseline.
+
+Run with ``poetry run python -m tests.benchmark_logging``
+"""
+# pylint: disable=protected-access, import-outside-toplevel
+import argparse
+import logging
+import math
+import time
+import typing
+from typing import Any
+from typing import Tuple
+
+from tox_poetry_installer import _poetry
+from tox_poetry_installer import constants
+from tox_poetry_installer import logger
+from tox_poetry_installer import utilities
+
+
+def build_packages(count: int, fanout: int) -> utilities.PackageMap:
+    """Build a lock graph where each package requires ``fanout`` packages of the next layer
+
+    One in four packages is only locked for Python 2, so it is skipped when resolving for
+    Python 3 along with the packages that only it requires.
+    """
+    from poetry.core.version.markers import parse_marker
+
+    python2 = parse_marker('python_version < "3"')
+    packages: utilities.PackageMap = {}
+    for index in range(count):
+        package = _poetry.PoetryPackage(f"package-{index}", "1.0.0")
+        if index % 4 == 3:
+            package.marker = python2
+        for child in range(
+            index * fanout + 1, min(index * fanout + fanout, count - 1) + 1
+        ):
+            package.add_dependency(
+                _poetry.PoetryDependency(f"package-{child}", "1.0.0")
+            )
+        packages.setdefault(package.name, []).append(package)
+    return packages
+
+
+def _eager_log(level: int, message: str, args: Tuple[Any, ...]):
+    logging.log(level, f"{constants.REPORTER_PREFIX} {message % args}")
+
+
+def _no_log(*_: Any):
+    pass
+
+
+def _resolve(packages: utilities.PackageMap, rounds: int) -> float:
+    from poetry.utils.env import MockEnv
+
+    # Provides the marker environment of a Python 3.10 virtualenv without creating one
+    venv = typing.cast(_poetry.VirtualEnv, MockEnv(version_info=(3, 10, 0)))
+    best = math.inf
+    for _ in range(rounds):
+        start = time.perf_counter()
+        utilities.identify_transients("package-0", packages, venv)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--packages", type=int, default=20000)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    packages = build_packages(args.packages, args.fanout)
+
+    modes = {
+        "none": (_no_log, lambda: False),
+        "eager": (_eager_log, lambda: True),
+        "lazy": (logger._log, logger.is_debug),
+    }
+    original = logger._log, logger.is_debug
+    timings = {}
+    try:
+        # Warm up any caches shared between the modes before timing them
+        _resolve(packages, 1)
+        for mode, (log, is_debug) in modes.items():
+            logger._log, logger.is_debug = log, is_debug
+            timings[mode] = _resolve(packages, args.rounds)
+    finally:
+        logger._log, logger.is_debug = original
+
+    print(f"Best time to resolve {args.packages} packages over {args.rounds} rounds")
+    for mode, timing in timings.items():
+        overhead = timing - timings["none"]
+        print(f"{mode:>6} logging: {timing:.3f}s ({overhead * 1000:+.1f}ms overhead)")
+
+
+if __name__ == "__main__":
+    main()
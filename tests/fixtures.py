@@ -1,15 +1,32 @@
 # pylint: disable=missing-module-docstring, missing-function-docstring, unused-argument, too-few-public-methods
+import base64
+import functools
+import hashlib
+import http.server
+import random
+import subprocess
+import sys
+import threading
 import time
+import zipfile
 from pathlib import Path
+from typing import Dict
 from typing import List
+from typing import Optional
+from typing import Tuple
 
 import poetry.factory
 import poetry.installation.executor
 import poetry.utils.env
 import pytest
 import tox.tox_env.python.virtual_env.runner
+from poetry.core.packages.package import Package as PoetryPackage
 from poetry.installation.operations.operation import Operation
+from poetry.repositories.legacy_repository import LegacyRepository
+from poetry.repositories.repository_pool import RepositoryPool
 
+from tox_poetry_installer import _poetry
+from tox_poetry_installer import daemon
 from tox_poetry_installer import utilities
 
 
@@ -24,6 +41,7 @@ class MockVirtualEnv:
     def __init__(self, *args, **kwargs):
         self.env_dir = FAKE_VENV_PATH
         self.installed = []
+        self.marker_env = {"python_version": "1.2"}
 
     @staticmethod
     def is_valid_for_marker(*args, **kwargs):
@@ -45,10 +63,59 @@ class MockExecutor:
         time.sleep(1)
 
 
+class ExclusiveExecutor:
+    """Stand-in for the Poetry executor that fails if two threads use it at once
+
+    :param installed: List to add each installed package to
+    :param executors: List to add the executor to
+    """
+
+    def __init__(self, installed, executors, **kwargs):
+        self.installed = installed
+        self.lock = threading.Lock()
+        self.busy = False
+        executors.append(self)
+
+    def execute(self, operations):
+        """Install the packages of the operations, after a short random delay"""
+        with self.lock:
+            if self.busy:
+                raise RuntimeError("Executor used by more than one thread at once")
+            self.busy = True
+        try:
+            time.sleep(random.random() / 1000)
+            self.installed.extend(operation.package for operation in operations)
+        finally:
+            self.busy = False
+        return 0
+
+
+class RecordingExecutor:
+    """Stand-in for the Poetry executor that records the order packages are installed in
+
+    :param order: List to add the name of each installed package to
+    :param queued: Event set once every package is waiting to be installed. The first package
+                   to be installed, ``new``, holds its worker until the event is set.
+    """
+
+    def __init__(self, order, queued, **kwargs):
+        self.order = order
+        self.queued = queued
+
+    def execute(self, operations):
+        """Record the packages of the operations"""
+        self.order.extend(operation.package.name for operation in operations)
+        # Hold the only worker until every package is waiting for it
+        if operations[0].package.name == "new":
+            assert self.queued.wait(timeout=10)
+        return 0
+
+
 @pytest.fixture
 def mock_venv(monkeypatch):
     monkeypatch.setattr(utilities, "convert_virtualenv", lambda venv: venv)
     monkeypatch.setattr(poetry.installation.executor, "Executor", MockExecutor)
+    monkeypatch.setattr(_poetry, "Executor", MockExecutor)
     monkeypatch.setattr(
         tox.tox_env.python.virtual_env.runner, "VirtualEnvRunner", MockVirtualEnv
     )
@@ -63,3 +130,112 @@ def mock_poetry_factory(monkeypatch):
         return pypoetry
 
     monkeypatch.setattr(poetry.factory.Factory, "create_poetry", mock_factory)
+
+
+def build_wheel(
+    directory: Path,
+    name: str,
+    version: str,
+    files: Dict[str, str],
+    unrecorded: Optional[Dict[str, str]] = None,
+) -> Path:
+    """Build a minimal pure Python wheel containing the given files
+
+    Files in ``unrecorded`` are added to the wheel without an entry in its RECORD file, which
+    makes the wheel invalid.
+    """
+    dist_info = f"{name}-{version}.dist-info"
+    contents = {
+        **files,
+        f"{dist_info}/METADATA": f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n",
+        f"{dist_info}/WHEEL": "Wheel-Version: 1.0\nGenerator: tests\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+    }
+    record = []
+    for path, content in contents.items():
+        digest = base64.urlsafe_b64encode(
+            hashlib.sha256(content.encode()).digest()
+        ).rstrip(b"=")
+        record.append(f"{path},sha256={digest.decode()},{len(content.encode())}")
+    record.append(f"{dist_info}/RECORD,,")
+
+    wheel = directory / f"{name}-{version}-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, "w") as archive:
+        for path, content in contents.items():
+            archive.writestr(path, content)
+        archive.writestr(f"{dist_info}/RECORD", "\n".join(record) + "\n")
+        for path, content in (unrecorded or {}).items():
+            archive.writestr(path, content)
+    return wheel
+
+
+@pytest.fixture
+def real_venv(tmp_path):
+    """Create an empty virtualenv and return a stand-in for the tox env that owns it"""
+    path = tmp_path / "venv"
+    subprocess.run(
+        [sys.executable, "-m", "venv", "--without-pip", str(path)], check=True
+    )
+    return daemon.DaemonEnv("real-venv", path)
+
+
+class _IndexRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve the files of a package index without logging every request"""
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class PackageIndex:
+    """Local simple package index, and a Poetry project that uses it as its only source"""
+
+    def __init__(self, directory: Path, url: str):
+        self.directory = directory
+        self.url = url
+        self.poetry = poetry.factory.Factory().create_poetry(TEST_PROJECT_PATH)
+        self.poetry.set_pool(
+            RepositoryPool([LegacyRepository("local", url)], config=self.poetry.config)
+        )
+
+    def add(
+        self,
+        name: str,
+        files: Dict[str, str],
+        unrecorded: Optional[Dict[str, str]] = None,
+    ) -> Tuple[PoetryPackage, Path]:
+        """Publish a wheel to the index and lock a package for it"""
+        project = self.directory / name.replace("_", "-")
+        project.mkdir(parents=True, exist_ok=True)
+        wheel = build_wheel(project, name, "1.0.0", files, unrecorded)
+        package = PoetryPackage(
+            name,
+            "1.0.0",
+            source_type="legacy",
+            source_url=self.url,
+            source_reference="local",
+        )
+        package.files = [
+            {
+                "file": wheel.name,
+                "hash": f"sha256:{hashlib.sha256(wheel.read_bytes()).hexdigest()}",
+            }
+        ]
+        return package, wheel
+
+
+@pytest.fixture
+def package_index(tmp_path, monkeypatch):
+    """Serve a package index from a temporary directory, with Poetry caching to another"""
+    monkeypatch.setenv("POETRY_CACHE_DIR", str(tmp_path / "cache"))
+    directory = tmp_path / "index"
+    directory.mkdir()
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        functools.partial(_IndexRequestHandler, directory=str(directory)),
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield PackageIndex(directory, f"http://127.0.0.1:{server.server_address[1]}")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,253 @@
+# pylint: disable=missing-module-docstring, redefined-outer-name, unused-argument, wrong-import-order, unused-import, protected-access
+import getpass
+import importlib
+import os
+import socket
+import socketserver
+import threading
+import types
+from unittest import mock
+
+import pytest
+from poetry.factory import Factory
+
+from .fixtures import mock_poetry_factory
+from .fixtures import mock_venv
+from .fixtures import MockVirtualEnv
+from .fixtures import TEST_PROJECT_PATH
+from tox_poetry_installer import constants
+from tox_poetry_installer import daemon
+from tox_poetry_installer import durations
+from tox_poetry_installer import exceptions
+from tox_poetry_installer import hooks
+from tox_poetry_installer import resolutions
+from tox_poetry_installer import utilities
+
+
+@pytest.fixture
+def daemon_socket(tmp_path, mock_venv, mock_poetry_factory, monkeypatch):
+    """Serve a daemon in a background thread, and return its socket and the mock virtualenv"""
+    venv = MockVirtualEnv()
+    monkeypatch.setattr(utilities, "convert_virtualenv", lambda _: venv)
+    monkeypatch.setitem(
+        utilities._SHARED_STORES, durations.InstallHistory, durations.InstallHistory()
+    )
+    monkeypatch.setitem(
+        utilities._SHARED_STORES,
+        resolutions.ResolutionCache,
+        resolutions.ResolutionCache(),
+    )
+
+    path = tmp_path / "daemon.sock"
+    server = daemon.DaemonServer(path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path, venv
+    server.shutdown()
+    server.server_close()
+
+
+def _request(action, **kwargs):
+    payload = {
+        "action": action,
+        "tox_root": str(TEST_PROJECT_PATH),
+        "env_name": "test",
+        "env_dir": "nowhere",
+    }
+    payload.update(kwargs)
+    return payload
+
+
+def test_no_daemon(tmp_path):
+    """Test that requests fall back when no daemon is listening"""
+    assert daemon.request(tmp_path / "missing.sock", {"action": "ping"}) is None
+
+
+def test_resolve(daemon_socket):
+    """Test that the daemon resolves the same dependencies as the plugin does in-process"""
+    path, venv = daemon_socket
+    assert "pid" in daemon.request(path, {"action": "ping"})
+
+    poetry = Factory().create_poetry(None)
+    packages = utilities.build_package_map(poetry)
+    expected = utilities.find_env_deps(
+        packages, venv, poetry, utilities.EnvDeps(groups=["dev"], dep_names=["toml"])
+    )
+
+    for _ in range(2):
+        resolved = daemon.request(
+            path,
+            _request(
+                "resolve",
+                poetry_dep_groups=["dev"],
+                locked_deps=["toml"],
+                extras=[],
+                install_project_deps=True,
+            ),
+        )
+        assert resolved["packages"] == [
+            [item.name, str(item.version)] for item in expected
+        ]
+
+
+def test_install(daemon_socket):
+    """Test that the daemon installs resolved dependencies and reports errors to the client"""
+    path, venv = daemon_socket
+    settings = {
+        "packages": [["toml", "0.10.2"]],
+        "parallel_install_threads": 0,
+        "fail_fast": True,
+        "bytecode_compilation": "none",
+    }
+
+    installed = daemon.request(
+        path, _request("install", installer_backend="poetry", **settings)
+    )
+    assert installed == {"installed": 1}
+    assert [str(item) for item in venv.installed] == ["toml (0.10.2)"]
+
+    with pytest.raises(exceptions.InstallerBackendNotFoundError):
+        daemon.request(path, _request("install", installer_backend="nope", **settings))
+
+    with pytest.raises(exceptions.DaemonRequestError):
+        daemon.request(path, _request("explode"))
+
+
+def test_no_unix_sockets(tmp_path, monkeypatch):
+    """Test that the daemon module imports and falls back where Unix sockets are unavailable"""
+    monkeypatch.delattr(socket, "AF_UNIX")
+    monkeypatch.delattr(socketserver, "UnixStreamServer")
+    monkeypatch.delattr(daemon, "DaemonServer")
+    try:
+        importlib.reload(daemon)
+        assert not hasattr(daemon, "DaemonServer")
+        assert daemon.request(tmp_path / "daemon.sock", {"action": "ping"}) is None
+        with pytest.raises(exceptions.DaemonRequestError):
+            daemon.serve(tmp_path / "daemon.sock")
+    finally:
+        monkeypatch.undo()
+        importlib.reload(daemon)
+
+
+def test_default_socket_unknown_user(monkeypatch):
+    """Test that the default socket does not require the current user to have a name"""
+
+    def mock_getuser():
+        raise KeyError("getpwuid(): uid not found: 1234")
+
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(getpass, "getuser", mock_getuser)
+    monkeypatch.setattr(os, "getuid", lambda: 1234, raising=False)
+    assert daemon.default_socket().name.endswith("-1234.sock")
+
+    monkeypatch.delattr(os, "getuid")
+    assert daemon.default_socket() is None
+
+
+def _tox_env(socket_path):
+    """Stand-in for a Tox environment that requires locked dependencies but lists unlocked ones"""
+    deps = mock.MagicMock()
+    deps.lines.return_value = ["pytest"]
+    deps.__str__.return_value = "pytest"
+    return types.SimpleNamespace(
+        name="test",
+        env_dir="nowhere",
+        core={"tox_root": TEST_PROJECT_PATH},
+        conf={
+            "require_locked_deps": True,
+            "deps": deps,
+            "poetry_dep_groups": [],
+            "locked_deps": ["toml"],
+            "extras": [],
+            "install_project_deps": False,
+            "installer_backend": "poetry",
+        },
+        options=types.SimpleNamespace(
+            daemon_socket=socket_path,
+            parallel_install_threads=0,
+            collect_install_failures=False,
+            bytecode_compilation="none",
+        ),
+    )
+
+
+def test_locked_deps_required(daemon_socket, tmp_path):
+    """Test that unlocked dependencies are only rejected once the daemon has loaded the project"""
+    path, venv = daemon_socket
+
+    assert not hooks._install_with_daemon(_tox_env(tmp_path / "missing.sock"))
+
+    with pytest.raises(exceptions.LockedDepsRequiredError):
+        hooks._install_with_daemon(_tox_env(path))
+    assert not venv.installed
+
+
+def test_venvs_bounded(tmp_path, monkeypatch):
+    """Test that the daemon only keeps the most recently used virtualenvs loaded"""
+    monkeypatch.setattr(constants, "DAEMON_MAX_VENVS", 2)
+    monkeypatch.setattr(utilities, "convert_virtualenv", lambda env: env)
+    server = daemon.Daemon()
+
+    first = server.venv(str(tmp_path / "first"), "first")
+    server.venv(str(tmp_path / "second"), "second")
+    assert server.venv(str(tmp_path / "first"), "first") is first
+    server.venv(str(tmp_path / "third"), "third")
+
+    assert list(server._venvs) == [str(tmp_path / "first"), str(tmp_path / "third")]
+
+
+def test_default_socket_runtime_dir(tmp_path, monkeypatch):
+    """Test that the default socket is placed in the per-user runtime directory if there is one"""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert daemon.default_socket().parent == tmp_path
+
+
+def test_untrusted_socket(daemon_socket, monkeypatch, caplog):
+    """Test that sockets other users could have created or can access are not used"""
+    path, _ = daemon_socket
+    assert daemon.request(path, {"action": "ping"}) is not None
+
+    os.chmod(path, 0o666)
+    assert daemon.request(path, {"action": "ping"}) is None
+    os.chmod(path, 0o600)
+
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(path).st_uid + 1)
+    assert daemon.request(path, {"action": "ping"}) is None
+    assert "not owned by the current user" in caplog.text
+
+
+def _serve_once(path, response):
+    """Accept a single connection on a socket and answer it with a fixed response"""
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        server.bind(str(path))
+    finally:
+        os.umask(umask)
+    server.listen(1)
+
+    def answer():
+        connection, _ = server.accept()
+        with connection:
+            connection.makefile("rb").readline()
+            if response is not None:
+                connection.sendall(response)
+            release.wait(timeout=10)
+
+    release = threading.Event()
+    thread = threading.Thread(target=answer, daemon=True)
+    thread.start()
+    return server, release
+
+
+@pytest.mark.parametrize("response", (None, b"not json\n"))
+def test_unresponsive_daemon(tmp_path, response):
+    """Test that a daemon that does not answer, or answers nonsense, fails the request"""
+    path = tmp_path / "daemon.sock"
+    server, release = _serve_once(path, response)
+    try:
+        with pytest.raises(exceptions.DaemonRequestError):
+            daemon.request(path, {"action": "ping"}, timeout=0.5)
+    finally:
+        release.set()
+        server.close()
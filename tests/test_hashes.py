@@ -0,0 +1,131 @@
+# pylint: disable=missing-module-docstring, redefined-outer-name, unused-argument, wrong-import-order, unused-import
+import hashlib
+import os
+
+import pytest
+from poetry.core.packages.package import Package as PoetryPackage
+
+from tox_poetry_installer import _poetry
+from tox_poetry_installer import backends
+from tox_poetry_installer import exceptions
+from tox_poetry_installer import hashes
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    """Artifact file and a locked package with the artifact's hash"""
+    archive = tmp_path / "foo-1.0.0-py3-none-any.whl"
+    archive.write_bytes(b"wheel contents")
+    package = PoetryPackage("foo", "1.0.0")
+    package.files = [
+        {
+            "file": archive.name,
+            "hash": f"sha256:{hashlib.sha256(b'wheel contents').hexdigest()}",
+        }
+    ]
+    return archive, package
+
+
+@pytest.fixture
+def hash_calls(monkeypatch):
+    """Paths of the files hashed during the test"""
+    calls = []
+    get_file_hash = _poetry.get_file_hash
+
+    def mock_get_file_hash(path, hash_name):
+        calls.append(path)
+        return get_file_hash(path, hash_name)
+
+    monkeypatch.setattr(_poetry, "get_file_hash", mock_get_file_hash)
+    return calls
+
+
+def test_skip_verified(artifact, hash_calls, tmp_path):
+    """Test that unchanged artifacts are only hashed once and changed artifacts are rehashed"""
+    archive, package = artifact
+    cache = hashes.VerifiedHashCache(tmp_path / "cache" / "verified.json")
+
+    backends.verify_archive_hash(archive, package, cache)
+    backends.verify_archive_hash(archive, package, cache)
+    assert len(hash_calls) == 1
+
+    # A new cache reads the verified artifacts saved by the first
+    cache.save()
+    backends.verify_archive_hash(archive, package, hashes.VerifiedHashCache(cache.path))
+    assert len(hash_calls) == 1
+
+    info = archive.stat()
+    os.utime(archive, ns=(info.st_atime_ns, info.st_mtime_ns + 1_000_000_000))
+    backends.verify_archive_hash(archive, package, cache)
+    assert len(hash_calls) == 2
+
+    archive.write_bytes(b"tampered wheel")
+    with pytest.raises(exceptions.LockedDepHashMismatchError):
+        backends.verify_archive_hash(archive, package, cache)
+
+
+def test_locked_hash_changed(artifact, hash_calls):
+    """Test that artifacts are verified again when the locked hashes change"""
+    archive, package = artifact
+    cache = hashes.VerifiedHashCache()
+
+    backends.verify_archive_hash(archive, package, cache)
+
+    package.files = [{"file": archive.name, "hash": f"sha256:{'0' * 64}"}]
+    with pytest.raises(exceptions.LockedDepHashMismatchError):
+        backends.verify_archive_hash(archive, package, cache)
+    assert len(hash_calls) == 2
+
+
+def test_unreadable_cache(artifact, hash_calls, tmp_path):
+    """Test that a corrupt cache file is ignored and replaced"""
+    archive, package = artifact
+    path = tmp_path / "verified.json"
+    path.write_text("{not json")
+
+    cache = hashes.VerifiedHashCache(path)
+    backends.verify_archive_hash(archive, package, cache)
+    cache.save()
+    backends.verify_archive_hash(archive, package, hashes.VerifiedHashCache(path))
+    assert len(hash_calls) == 1
+
+
+def test_batched_save(artifact, tmp_path):
+    """Test that verified artifacts are only written to the cache file when it is saved"""
+    archive, package = artifact
+    other = tmp_path / "bar-1.0.0-py3-none-any.whl"
+    other.write_bytes(b"other wheel")
+    path = tmp_path / "verified.json"
+    cache = hashes.VerifiedHashCache(path)
+
+    backends.verify_archive_hash(archive, package, cache)
+    cache.record(other, "sha256:abc", cache.state(other))
+    assert not path.exists()
+
+    cache.save()
+    saved = hashes.VerifiedHashCache(path)
+    assert saved.verified(archive, {item["hash"] for item in package.files})
+    assert saved.verified(other, {"sha256:abc"})
+
+    # Saving again without recording anything new leaves the file alone
+    path.unlink()
+    cache.save()
+    assert not path.exists()
+
+
+def test_changed_while_hashing(artifact, monkeypatch):
+    """Test that an artifact that changes while it is being hashed is not recorded"""
+    archive, package = artifact
+    cache = hashes.VerifiedHashCache()
+    get_file_hash = _poetry.get_file_hash
+
+    def mock_get_file_hash(path, hash_name):
+        digest = get_file_hash(path, hash_name)
+        info = path.stat()
+        os.utime(path, ns=(info.st_atime_ns, info.st_mtime_ns + 1_000_000_000))
+        return digest
+
+    monkeypatch.setattr(_poetry, "get_file_hash", mock_get_file_hash)
+    backends.verify_archive_hash(archive, package, cache)
+
+    assert not cache.verified(archive, {item["hash"] for item in package.files})
@@ -1,13 +1,30 @@
-# pylint: disable=missing-module-docstring, redefined-outer-name, unused-argument, wrong-import-order, unused-import
+# pylint: disable=missing-module-docstring, redefined-outer-name, unused-argument, wrong-import-order, unused-import, protected-access
+import base64
+import functools
+import hashlib
+import logging
+import threading
 import time
+from pathlib import Path
 from unittest import mock
 
 import pytest
 import tox.tox_env.python.virtual_env.runner
+from poetry.core.packages.package import Package as PoetryPackage
 from poetry.factory import Factory
 
+from .fixtures import build_wheel
+from .fixtures import ExclusiveExecutor
 from .fixtures import mock_poetry_factory
 from .fixtures import mock_venv
+from .fixtures import package_index
+from .fixtures import real_venv
+from .fixtures import RecordingExecutor
+from .fixtures import TEST_PROJECT_PATH
+from tox_poetry_installer import backends
+from tox_poetry_installer import durations
+from tox_poetry_installer import exceptions
+from tox_poetry_installer import hashes
 from tox_poetry_installer import installer
 from tox_poetry_installer import utilities
 
@@ -88,3 +105,395 @@ def test_propagates_exceptions_during_installation(
             installer.install(poetry, venv, to_install, num_threads)
 
     assert exc_info.value is fake_exception
+
+
+def test_unknown_backend():
+    """Test that selecting an installer backend that does not exist raises an error"""
+    with pytest.raises(exceptions.InstallerBackendNotFoundError):
+        backends.get_backend("darth-vader")
+
+    assert backends.get_backend("poetry") is backends.PoetryBackend
+    assert backends.get_backend("wheel") is backends.WheelBackend
+
+
+def test_backend_poetry_version(monkeypatch):
+    """Test that selecting a backend the installed Poetry version does not support is an error"""
+    from tox_poetry_installer import _poetry  # pylint: disable=import-outside-toplevel
+
+    monkeypatch.setattr(_poetry, "POETRY_VERSION", "1.5.0")
+    assert backends.get_backend("poetry") is backends.PoetryBackend
+    with pytest.raises(exceptions.InstallerBackendNotFoundError) as exc_info:
+        backends.get_backend("wheel")
+    assert "requires Poetry 1.7 or later" in str(exc_info.value)
+
+    monkeypatch.setattr(_poetry, "POETRY_VERSION", "1.10.0")
+    assert backends.get_backend("wheel") is backends.WheelBackend
+
+
+def test_wheel_backend_fallback(mock_venv, mock_poetry_factory):
+    """Test that the wheel backend installs non-index packages using the Poetry executor"""
+    poetry = Factory().create_poetry(None)
+    venv = tox.tox_env.python.virtual_env.runner.VirtualEnvRunner()
+    package = PoetryPackage(
+        "luke-skywalker",
+        "1.0.0",
+        source_type="directory",
+        source_url=str(Path(__file__).parent),
+    )
+
+    installer.install(
+        poetry, venv, [package], backend=backends.WheelBackend(poetry, venv)
+    )
+
+    assert venv.installed == [package]  # pylint: disable=no-member
+
+
+@pytest.mark.parametrize("num_threads", (0, 1))
+def test_fail_fast(mock_venv, mock_poetry_factory, num_threads):
+    """Test that pending installs are cancelled after the first installation failure"""
+    from tox_poetry_installer import _poetry  # pylint: disable=import-outside-toplevel
+
+    poetry = Factory().create_poetry(None)
+    to_install = list(poetry.locker.locked_repository().packages)
+    venv = tox.tox_env.python.virtual_env.runner.VirtualEnvRunner()
+    fake_exception = ValueError("my testing exception")
+
+    with mock.patch.object(
+        _poetry,
+        "Executor",
+        **{"return_value.execute.side_effect": fake_exception},
+    ) as mock_executor:
+        with pytest.raises(ValueError) as exc_info:
+            installer.install(poetry, venv, to_install, num_threads)
+
+    assert exc_info.value is fake_exception
+    assert mock_executor.return_value.execute.call_count < len(to_install) / 2
+
+
+@pytest.mark.parametrize("num_threads", (0, 8))
+def test_collect_failures(mock_venv, mock_poetry_factory, num_threads):
+    """Test that every package is attempted when fail fast is disabled"""
+    from tox_poetry_installer import _poetry  # pylint: disable=import-outside-toplevel
+
+    poetry = Factory().create_poetry(None)
+    to_install = list(poetry.locker.locked_repository().packages)
+    venv = tox.tox_env.python.virtual_env.runner.VirtualEnvRunner()
+
+    with mock.patch.object(
+        _poetry,
+        "Executor",
+        **{"return_value.execute.side_effect": ValueError("my testing exception")},
+    ) as mock_executor:
+        with pytest.raises(exceptions.LockedDepsInstallError):
+            installer.install(poetry, venv, to_install, num_threads, fail_fast=False)
+
+    assert mock_executor.return_value.execute.call_count == len(to_install)
+
+
+def test_executor_failure_recovery(real_venv, tmp_path):
+    """Test that a failed install does not fail the later installs of the same worker thread"""
+    poetry = Factory().create_poetry(TEST_PROJECT_PATH)
+    packages = [
+        PoetryPackage(
+            name,
+            "1.0.0",
+            source_type="file",
+            source_url=str(build_wheel(tmp_path, name, "1.0.0", {f"{name}.py": ""})),
+        )
+        for name in ("leia_organa", "han_solo")
+    ]
+    missing = PoetryPackage(
+        "vader",
+        "1.0.0",
+        source_type="file",
+        source_url=str(tmp_path / "vader-1.0.0-py3-none-any.whl"),
+    )
+
+    with pytest.raises(exceptions.LockedDepsInstallError) as exc_info:
+        installer.install(
+            poetry, real_venv, [packages[0], missing, packages[1]], fail_fast=False
+        )
+
+    assert "vader (" in str(exc_info.value)
+    assert "han-solo (" not in str(exc_info.value)
+    site_packages = Path(utilities.convert_virtualenv(real_venv).paths["purelib"])
+    assert (site_packages / "leia_organa.py").exists()
+    assert (site_packages / "han_solo.py").exists()
+
+
+def test_compile_bytecode(monkeypatch):
+    """Test that deferred compilation compiles every site-packages dir in one parallel pass"""
+    env = mock.Mock(paths={"purelib": "/venv/lib", "platlib": "/venv/lib"})
+    monkeypatch.setattr(utilities, "convert_virtualenv", lambda venv: env)
+
+    installer.compile_bytecode(mock.Mock())
+
+    env.run.assert_called_once_with(
+        "python", "-m", "compileall", "-q", "-j", "0", "/venv/lib"
+    )
+
+
+def test_compile_bytecode_invalid_files(real_venv):
+    """Test that files which cannot be compiled do not fail deferred compilation"""
+    site_packages = Path(utilities.convert_virtualenv(real_venv).paths["purelib"])
+    (site_packages / "valid.py").write_text("print('hello')\n")
+    (site_packages / "invalid.py").write_text("print 'hello'\n")
+
+    installer.compile_bytecode(real_venv)
+
+    compiled = {
+        path.name.split(".")[0] for path in (site_packages / "__pycache__").iterdir()
+    }
+    assert compiled == {"valid"}
+
+
+def test_parallel_stress(mock_venv, mock_poetry_factory):
+    """Test that hundreds of concurrent installs never share an executor between threads"""
+    from tox_poetry_installer import _poetry  # pylint: disable=import-outside-toplevel
+
+    installed = []
+    executors = []
+
+    poetry = Factory().create_poetry(None)
+    venv = tox.tox_env.python.virtual_env.runner.VirtualEnvRunner()
+    packages = [PoetryPackage(f"package-{index}", "1.0.0") for index in range(500)]
+
+    with mock.patch.object(
+        _poetry,
+        "Executor",
+        functools.partial(ExclusiveExecutor, installed, executors),
+    ):
+        installer.install(poetry, venv, packages + packages[::3], 64)
+
+    assert sorted(installed, key=str) == sorted(packages, key=str)
+    assert len(executors) <= 64
+
+
+def test_streaming(mock_venv, mock_poetry_factory):
+    """Test that streamed packages start installing before resolution finishes"""
+    poetry = Factory().create_poetry(None)
+    venv = tox.tox_env.python.virtual_env.runner.VirtualEnvRunner()
+    packages = [PoetryPackage(f"package-{index}", "1.0.0") for index in range(4)]
+
+    started = []
+
+    def resolve():
+        for package in packages:
+            yield package
+            time.sleep(0.1)
+        started.extend(venv.installed)  # pylint: disable=no-member
+
+    installer.install(poetry, venv, resolve(), 4)
+    assert started
+    assert sorted(venv.installed, key=str) == packages  # pylint: disable=no-member
+
+    def broken():
+        yield from packages
+        raise exceptions.LockedDepNotFoundError("my testing exception")
+
+    venv.installed = []
+    with pytest.raises(exceptions.LockedDepNotFoundError):
+        installer.install(poetry, venv, broken(), 1)
+    assert len(venv.installed) < len(packages)  # pylint: disable=no-member
+
+
+@pytest.mark.parametrize("lazy", (False, True))
+def test_fail_fast_summary(mock_venv, mock_poetry_factory, caplog, lazy):
+    """Test that packages which were never queued after a failure are counted as cancelled"""
+    from tox_poetry_installer import _poetry  # pylint: disable=import-outside-toplevel
+
+    poetry = Factory().create_poetry(None)
+    venv = tox.tox_env.python.virtual_env.runner.VirtualEnvRunner()
+    packages = [PoetryPackage(f"package-{index}", "1.0.0") for index in range(4)]
+    to_install = packages + packages[:1]
+
+    with mock.patch.object(
+        _poetry,
+        "Executor",
+        **{"return_value.execute.side_effect": ValueError("my testing exception")},
+    ):
+        with pytest.raises(ValueError):
+            installer.install(poetry, venv, iter(to_install) if lazy else to_install, 0)
+
+    assert "Failed to install 1 packages (0 completed, 3 cancelled)" in caplog.text
+
+
+class FinishRecordingBackend(backends.InstallerBackend):
+    """Installer backend that records the packages it installs and whether it was finished"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.installed = []
+        self.finished = False
+
+    def install(self, package):
+        self.installed.append(package)
+
+    def finish(self):
+        self.finished = True
+
+
+def test_resolution_failure_finishes(mock_venv, mock_poetry_factory, tmp_path):
+    """Test that the backend and install history are saved when resolution fails"""
+    poetry = Factory().create_poetry(None)
+    venv = tox.tox_env.python.virtual_env.runner.VirtualEnvRunner()
+    backend = FinishRecordingBackend(poetry, venv)
+    history = durations.InstallHistory(tmp_path / "durations.json")
+    package = PoetryPackage("luke-skywalker", "1.0.0")
+
+    def broken():
+        yield package
+        raise exceptions.LockedDepNotFoundError("my testing exception")
+
+    with pytest.raises(exceptions.LockedDepNotFoundError):
+        installer.install(poetry, venv, broken(), 0, backend=backend, history=history)
+
+    assert backend.installed == [package]
+    assert backend.finished
+    assert history.path.exists()
+
+
+def test_longest_first(mock_venv, mock_poetry_factory, tmp_path):
+    """Test that packages expected to take the longest to install are started first"""
+    from tox_poetry_installer import _poetry  # pylint: disable=import-outside-toplevel
+
+    order = []
+    queued = threading.Event()
+
+    poetry = Factory().create_poetry(None)
+    venv = tox.tox_env.python.virtual_env.runner.VirtualEnvRunner()
+    packages = {
+        name: PoetryPackage(name, "1.0.0")
+        for name in ("new", "small", "huge", "large", "medium")
+    }
+
+    history = durations.InstallHistory(tmp_path / "durations.json")
+    abi = utilities.abi_tag(venv)
+    for name, duration in (("small", 1), ("huge", 50), ("large", 30), ("medium", 2)):
+        history.record(packages[name], abi, duration)
+
+    def resolve():
+        yield from packages.values()
+        # Only reached once the installer has queued the last package
+        queued.set()
+
+    with mock.patch.object(
+        _poetry, "Executor", functools.partial(RecordingExecutor, order, queued)
+    ):
+        installer.install(poetry, venv, resolve(), 1, history=history)
+
+    assert order == ["new", "huge", "large", "medium", "small"]
+
+    saved = durations.InstallHistory(history.path)
+    assert saved.estimate(packages["new"], abi) is not None
+    assert saved.estimate(packages["huge"], abi) < 50
+    assert saved.estimate(packages["huge"], "cp-3_11-linux-x86_64") is None
+
+
+def test_executor_failure_output(real_venv, tmp_path):
+    """Test that a failed install reports the cause of the failure from the executor output"""
+    poetry = Factory().create_poetry(TEST_PROJECT_PATH)
+    installed = PoetryPackage(
+        "leia_organa",
+        "1.0.0",
+        source_type="file",
+        source_url=str(build_wheel(tmp_path, "leia_organa", "1.0.0", {})),
+    )
+    missing = PoetryPackage(
+        "vader",
+        "1.0.0",
+        source_type="file",
+        source_url=str(tmp_path / "vader-1.0.0-py3-none-any.whl"),
+    )
+    backend = backends.PoetryBackend(poetry, real_venv)
+
+    backend.install(installed)
+    with pytest.raises(exceptions.LockedDepsInstallError) as exc_info:
+        backend.install(missing)
+
+    assert "FileNotFoundError" in str(exc_info.value)
+    assert "leia" not in str(exc_info.value)
+
+
+def test_wheel_backend_install(real_venv, package_index, tmp_path, monkeypatch):
+    """Test that the wheel backend downloads, verifies, and unpacks a wheel from a package index"""
+    hash_cache = hashes.VerifiedHashCache(tmp_path / "verified.json")
+    monkeypatch.setitem(utilities._SHARED_STORES, hashes.VerifiedHashCache, hash_cache)
+    package, wheel = package_index.add(
+        "leia_organa", {"leia_organa/__init__.py": "PRINCESS = True\n"}
+    )
+
+    installer.install(
+        package_index.poetry,
+        real_venv,
+        [package],
+        backend=backends.WheelBackend(package_index.poetry, real_venv),
+    )
+
+    assert list((tmp_path / "cache" / "artifacts").rglob(wheel.name))
+    assert hash_cache.path.exists()
+    site_packages = Path(utilities.convert_virtualenv(real_venv).paths["purelib"])
+    module = site_packages / "leia_organa" / "__init__.py"
+    assert module.read_text() == "PRINCESS = True\n"
+
+    record = (site_packages / "leia_organa-1.0.0.dist-info" / "RECORD").read_text()
+    entries = {line.split(",")[0]: line.split(",")[1:] for line in record.splitlines()}
+    digest = base64.urlsafe_b64encode(hashlib.sha256(module.read_bytes()).digest())
+    assert entries["leia_organa/__init__.py"] == [
+        f"sha256={digest.rstrip(b'=').decode()}",
+        str(module.stat().st_size),
+    ]
+    for path in entries:
+        assert (site_packages / path).exists()
+
+
+def test_wheel_backend_invalid_wheel(real_venv, package_index, monkeypatch):
+    """Test that a wheel whose RECORD file does not match its contents fails to install"""
+    monkeypatch.setitem(
+        utilities._SHARED_STORES, hashes.VerifiedHashCache, hashes.VerifiedHashCache()
+    )
+    package, wheel = package_index.add(
+        "vader", {"vader.py": ""}, unrecorded={"sith.py": ""}
+    )
+
+    with pytest.raises(exceptions.LockedDepsInstallError) as exc_info:
+        installer.install(
+            package_index.poetry,
+            real_venv,
+            [package],
+            backend=backends.WheelBackend(package_index.poetry, real_venv),
+        )
+
+    assert wheel.name in str(exc_info.value)
+    assert "sith.py" in str(exc_info.value)
+
+
+class LogRecordingBackend(backends.InstallerBackend):
+    """Installer backend that records the messages logged before each install
+
+    :param caplog: Pytest log capture to record the messages of
+    """
+
+    def __init__(self, poetry, venv, caplog):
+        super().__init__(poetry, venv)
+        self.caplog = caplog
+        self.messages = []
+
+    def install(self, package):
+        self.messages.extend(self.caplog.messages)
+
+
+def test_install_logged_before_finish(mock_venv, mock_poetry_factory, caplog):
+    """Test that the start of each install is logged before the install finishes"""
+    caplog.set_level(logging.DEBUG)
+    poetry = Factory().create_poetry(None)
+    venv = tox.tox_env.python.virtual_env.runner.VirtualEnvRunner()
+    backend = LogRecordingBackend(poetry, venv, caplog)
+    package = PoetryPackage("luke-skywalker", "1.0.0")
+
+    installer.install(poetry, venv, [package], 1, backend=backend)
+
+    assert any(
+        message.endswith("Installing luke-skywalker (1.0.0)")
+        for message in backend.messages
+    )
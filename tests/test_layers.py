@@ -0,0 +1,100 @@
+# pylint: disable=missing-module-docstring, redefined-outer-name, unused-argument, wrong-import-order, unused-import, too-few-public-methods
+import tarfile
+
+import pytest
+from poetry.factory import Factory
+
+from .fixtures import mock_poetry_factory
+from tox_poetry_installer import constants
+from tox_poetry_installer import layers
+from tox_poetry_installer import utilities
+
+
+class LayerEnv:
+    """Minimal stand-in for a Poetry virtualenv rooted in a real directory"""
+
+    def __init__(self, path, version="3_11"):
+        self.path = path
+        self.python = path / "bin" / "python"
+        self.paths = {"scripts": str(path / "bin")}
+        self.marker_env = {
+            "interpreter_name": "cp",
+            "interpreter_version": version,
+            "sys_platform": "linux",
+            "platform_machine": "x86_64",
+        }
+        (path / "bin").mkdir(parents=True)
+        (path / "lib").mkdir()
+        (path / "pyvenv.cfg").write_text("home = /usr/bin\n")
+
+
+def _install(env):
+    (env.path / "lib" / "toml.py").write_text("TOML = True\n")
+    (env.path / "bin" / "tomlify").write_text(f"#!{env.python}\nimport toml\n")
+
+
+def test_layer_name(mock_poetry_factory, tmp_path):
+    """Test that layer names depend on the resolved packages and the interpreter ABI"""
+    poetry = Factory().create_poetry(None)
+    packages = utilities.build_package_map(poetry)
+    resolved = [packages["toml"][0], packages["tox"][0]]
+
+    env = LayerEnv(tmp_path / "a")
+    name = layers.layer_name(resolved, env)
+
+    assert name.startswith("cp-3_11-linux-x86_64-")
+    assert name.endswith(constants.LAYER_ARCHIVE_SUFFIX)
+    assert name == layers.layer_name(list(reversed(resolved)), env)
+    assert name != layers.layer_name(resolved[:1], env)
+    assert name != layers.layer_name(resolved, env, "deferred")
+    assert name != layers.layer_name(resolved, LayerEnv(tmp_path / "b", "3_10"))
+
+
+def test_capture_restore(tmp_path):
+    """Test that a captured layer restores the installed files into a fresh virtualenv"""
+    archive = tmp_path / "layers" / "test.tar.gz"
+    source = LayerEnv(tmp_path / "source")
+
+    with layers.capture(archive, source):
+        _install(source)
+
+    with tarfile.open(archive) as layer:
+        assert sorted(layer.getnames()) == [
+            constants.LAYER_METADATA_NAME,
+            "bin/tomlify",
+            "lib/toml.py",
+        ]
+
+    target = LayerEnv(tmp_path / "target")
+    assert layers.restore(archive, target)
+    assert (target.path / "lib" / "toml.py").read_text() == "TOML = True\n"
+    assert (
+        (target.path / "bin" / "tomlify").read_text().startswith(f"#!{target.python}\n")
+    )
+
+    assert not layers.restore(tmp_path / "layers" / "missing.tar.gz", target)
+
+
+def test_capture_failure(tmp_path):
+    """Test that no layer is written when the install fails"""
+    archive = tmp_path / "test.tar.gz"
+    env = LayerEnv(tmp_path / "env")
+
+    with pytest.raises(RuntimeError):
+        with layers.capture(archive, env):
+            _install(env)
+            raise RuntimeError("install failed")
+
+    assert not archive.exists()
+    assert not list(tmp_path.glob("*.partial"))
+
+
+def test_restore_unsafe(tmp_path):
+    """Test that layers which would write outside of the virtualenv are not restored"""
+    archive = tmp_path / "test.tar.gz"
+    (tmp_path / "evil.py").write_text("")
+    with tarfile.open(archive, mode="w:gz") as layer:
+        layer.add(tmp_path / "evil.py", arcname="../evil.py")
+
+    env = LayerEnv(tmp_path / "env")
+    assert not layers.restore(archive, env)
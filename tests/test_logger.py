@@ -0,0 +1,24 @@
+# pylint: disable=missing-module-docstring, redefined-outer-name, unused-argument, wrong-import-order, unused-import
+import logging
+from unittest import mock
+
+from tox_poetry_installer import constants
+from tox_poetry_installer import logger
+
+
+def test_lazy_formatting(caplog):
+    """Test that message arguments are only formatted when the message is emitted"""
+    counted = mock.MagicMock()
+    counted.__str__.return_value = "counted"
+
+    caplog.set_level(logging.INFO)
+    assert not logger.is_debug()
+    logger.debug("Skipping %s", counted)
+    assert not counted.__str__.called
+    assert not caplog.records
+
+    caplog.set_level(logging.DEBUG)
+    assert logger.is_debug()
+    logger.debug("Including %s", counted)
+    assert counted.__str__.called
+    assert caplog.messages == [f"{constants.REPORTER_PREFIX} Including counted"]
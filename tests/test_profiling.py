@@ -0,0 +1,99 @@
+# pylint: disable=missing-module-docstring
+import cProfile
+import threading
+from unittest import mock
+
+from tox_poetry_installer import exceptions
+from tox_poetry_installer import hooks
+from tox_poetry_installer import profiling
+from tox_poetry_installer import utilities
+
+
+def test_profile(tmp_path):
+    """Test that profiles from multiple threads are combined and written to disk"""
+
+    def work():
+        return sorted(str(item) for item in range(1000))
+
+    with profiling.profile(tmp_path, "env-resolve", trace_memory=True) as profiler:
+        with profiler.thread():
+            work()
+
+        def threaded():
+            with profiler.thread():
+                work()
+
+        thread = threading.Thread(target=threaded)
+        thread.start()
+        thread.join()
+
+    stats = profiler.stats()
+    assert stats is not None
+    assert any(
+        function == "work" and calls == 2
+        for (_, _, function), (calls, *_) in stats.stats.items()  # type: ignore
+    )
+
+    assert (tmp_path / "env-resolve.pstats").is_file()
+    assert (tmp_path / "env-resolve.tracemalloc").is_file()
+    summary = (tmp_path / "env-resolve.txt").read_text()
+    assert "work" in summary
+    assert "Peak traced memory" in summary
+
+
+def test_profile_disabled(tmp_path):
+    """Test that nothing is profiled or written when profiling is disabled"""
+    with profiling.profile(None, "env-resolve", trace_memory=True) as profiler:
+        with profiler.thread():
+            sorted(range(1000))
+
+    assert profiler.stats() is None
+    assert not list(tmp_path.iterdir())
+
+
+class ExclusiveProfile(cProfile.Profile):
+    """Profile that, like the profiler from Python 3.12, cannot run alongside another thread's"""
+
+    def enable(self, *args, **kwargs):
+        """Only allow profiling of the main thread"""
+        if threading.current_thread() is not threading.main_thread():
+            raise ValueError("Another profiling tool is already active")
+        super().enable(*args, **kwargs)
+
+
+def test_profile_skipped_threads(tmp_path, monkeypatch):
+    """Test that threads which cannot be profiled are counted in the written summary"""
+    monkeypatch.setattr(cProfile, "Profile", ExclusiveProfile)
+
+    with profiling.profile(tmp_path, "env-install") as profiler:
+        with profiler.thread():
+            sorted(range(1000))
+
+        def threaded():
+            with profiler.thread():
+                sorted(range(1000))
+
+        for _ in range(2):
+            thread = threading.Thread(target=threaded)
+            thread.start()
+            thread.join()
+
+    assert profiler.skipped == 2
+    assert "by 2 threads is not included" in (tmp_path / "env-install.txt").read_text()
+
+
+def test_profile_memory_without_dir(monkeypatch, caplog):
+    """Test that tracing memory without a profile directory is reported as ignored"""
+    tox_env = mock.MagicMock()
+    tox_env.options.profile_dir = None
+    tox_env.options.profile_memory = True
+
+    def skip(_):
+        raise exceptions.SkipEnvironment("Not a real environment")
+
+    monkeypatch.setattr(hooks, "_install_with_daemon", lambda _: False)
+    monkeypatch.setattr(utilities, "check_preconditions", skip)
+
+    hooks.tox_on_install(tox_env, "")
+
+    assert "Ignoring the '--profile-memory' runtime option" in caplog.text
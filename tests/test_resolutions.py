@@ -0,0 +1,124 @@
+# pylint: disable=missing-module-docstring, redefined-outer-name, unused-argument, wrong-import-order, unused-import, protected-access
+import json
+import os
+import shutil
+
+import poetry.factory
+import pytest
+from poetry.utils.env import MockEnv
+
+from .fixtures import TEST_PROJECT_PATH
+from tox_poetry_installer import constants
+from tox_poetry_installer import hashes
+from tox_poetry_installer import resolutions
+from tox_poetry_installer import utilities
+
+
+@pytest.fixture
+def project(tmp_path):
+    """Copy of the test project that tests can modify"""
+    path = tmp_path / "project"
+    shutil.copytree(TEST_PROJECT_PATH, path)
+    return path
+
+
+@pytest.fixture
+def resolved(monkeypatch):
+    """Names of the locked dependencies that were resolved rather than taken from the cache"""
+    calls = []
+    identify_transients = utilities.identify_transients
+
+    def mock_identify_transients(dep_name, *args, **kwargs):
+        calls.append(dep_name)
+        return identify_transients(dep_name, *args, **kwargs)
+
+    monkeypatch.setattr(utilities, "identify_transients", mock_identify_transients)
+    return calls
+
+
+def _resolve(project, cache=None):
+    utilities.clear_closure_memo()
+    pypoetry = poetry.factory.Factory().create_poetry(project)
+    packages = utilities.build_package_map(pypoetry)
+    return utilities.find_env_deps(
+        packages,
+        MockEnv(version_info=(3, 10, 0)),
+        pypoetry,
+        utilities.EnvDeps(),
+        cache=cache,
+    )
+
+
+def test_lockfile_change(project, resolved, tmp_path):
+    """Test that only the dependencies affected by a lockfile change are resolved again"""
+    cache = resolutions.ResolutionCache(tmp_path / "resolved.json")
+    first = _resolve(project, cache)
+    roots = list(resolved)
+    assert "requests" in roots
+
+    # An unchanged lockfile reuses everything, even from a new cache that reads the saved copy
+    resolved.clear()
+    assert _resolve(project, resolutions.ResolutionCache(cache.path)) == first
+    lockfile = project / "poetry.lock"
+    info = lockfile.stat()
+    os.utime(lockfile, ns=(info.st_atime_ns, info.st_mtime_ns + 1_000_000_000))
+    assert _resolve(project, cache) == first
+    assert not resolved
+
+    lockfile.write_text(
+        lockfile.read_text().replace(
+            'name = "idna"\nversion = "2.10"', 'name = "idna"\nversion = "3.4"'
+        )
+    )
+    updated = _resolve(project, cache)
+    assert resolved == ["requests"]
+    assert updated == _resolve(project)
+    assert "idna" in {package.name for package in updated}
+    assert [str(package.version) for package in updated if package.name == "idna"] == [
+        "3.4"
+    ]
+
+    utilities.clear_closure_memo()
+
+
+def test_project_change(project, resolved):
+    """Test that nothing is reused when the lockfile belongs to a different project"""
+    cache = resolutions.ResolutionCache()
+    first = _resolve(project, cache)
+    roots = list(resolved)
+
+    pyproject = project / "pyproject.toml"
+    pyproject.write_text(
+        pyproject.read_text().replace('name = "test-project"', 'name = "other-project"')
+    )
+    lockfile = project / "poetry.lock"
+    lockfile.write_text(lockfile.read_text() + "\n")
+
+    resolved.clear()
+    assert _resolve(project, cache) == first
+    assert resolved == roots
+
+    utilities.clear_closure_memo()
+
+
+def test_removed_lockfile(project, tmp_path):
+    """Test that the records of lockfiles that no longer exist are dropped when saving"""
+    cache = resolutions.ResolutionCache(tmp_path / "resolved.json")
+    utilities.dump_json(cache.path, {str(tmp_path / "removed" / "poetry.lock"): {}})
+
+    _resolve(project, cache)
+
+    assert list(json.loads(cache.path.read_text())) == [str(project / "poetry.lock")]
+
+    utilities.clear_closure_memo()
+
+
+def test_shared(tmp_path, monkeypatch):
+    """Test that each cache has a single instance shared by the whole process"""
+    monkeypatch.setattr(utilities, "_SHARED_STORES", {})
+    monkeypatch.setattr(utilities, "cache_dir", lambda: tmp_path)
+
+    cache = resolutions.ResolutionCache.shared()
+    assert resolutions.ResolutionCache.shared() is cache
+    assert cache.path == tmp_path / constants.RESOLUTION_CACHE_FILENAME
+    assert isinstance(hashes.VerifiedHashCache.shared(), hashes.VerifiedHashCache)
@@ -1,11 +1,18 @@
-# pylint: disable=missing-module-docstring, redefined-outer-name, unused-argument, wrong-import-order, unused-import
+# pylint: disable=missing-module-docstring, redefined-outer-name, unused-argument, wrong-import-order, unused-import, protected-access
+import os
+import shutil
+
 import poetry.factory
 import poetry.utils.env
 import pytest
+from poetry.core.packages.dependency import Dependency as PoetryDependency
+from poetry.core.packages.package import Package as PoetryPackage
 from poetry.puzzle.provider import Provider
+from poetry.utils.env import MockEnv
 
 from .fixtures import mock_poetry_factory
 from .fixtures import mock_venv
+from .fixtures import TEST_PROJECT_PATH
 from tox_poetry_installer import constants
 from tox_poetry_installer import exceptions
 from tox_poetry_installer import utilities
@@ -77,3 +84,201 @@ def test_functional(mock_poetry_factory, mock_venv):
         transients = utilities.identify_transients(package.name, packages, venv)
         assert transients[-1] == package
         assert len(transients) == len(set(transients))
+
+
+def test_memoized_closures(mock_poetry_factory, mock_venv, monkeypatch):
+    """Test that each dependency closure is only resolved once per marker environment"""
+    pypoetry = poetry.factory.Factory().create_poetry(None)
+    packages = utilities.build_package_map(pypoetry)
+    venv = poetry.utils.env.VirtualEnv()  # pylint: disable=no-value-for-parameter
+
+    resolved = []
+    identify_transients = utilities.identify_transients
+
+    def mock_identify_transients(dep_name, *args, **kwargs):
+        resolved.append(dep_name)
+        return identify_transients(dep_name, *args, **kwargs)
+
+    monkeypatch.setattr(utilities, "identify_transients", mock_identify_transients)
+    utilities.clear_closure_memo()
+
+    project_deps = utilities.find_env_deps(
+        packages, venv, pypoetry, utilities.EnvDeps()
+    )
+    assert len(resolved) == len(set(resolved))
+
+    first = list(resolved)
+    assert (
+        utilities.find_env_deps(packages, venv, pypoetry, utilities.EnvDeps())
+        == project_deps
+    )
+    assert utilities.find_additional_deps(
+        packages, venv, pypoetry, ["requests", "flask"]
+    ) == utilities.dedupe_packages(
+        identify_transients("requests", packages, venv)
+        + identify_transients("flask", packages, venv)
+    )
+    assert resolved == first
+
+    venv.marker_env = {"python_version": "4.5"}
+    assert (
+        utilities.find_env_deps(packages, venv, pypoetry, utilities.EnvDeps())
+        == project_deps
+    )
+    assert resolved == first + first
+
+    utilities.clear_closure_memo()
+
+
+def test_memoized_closures_evicted(tmp_path):
+    """Test that the closures of a previous version of a lockfile are discarded"""
+    project = tmp_path / "project"
+    shutil.copytree(TEST_PROJECT_PATH, project)
+    lockfile = project / "poetry.lock"
+    venv = MockEnv(version_info=(3, 10, 0))
+    utilities.clear_closure_memo()
+
+    for offset in range(3):
+        info = lockfile.stat()
+        os.utime(lockfile, ns=(info.st_atime_ns, info.st_mtime_ns + offset))
+        pypoetry = poetry.factory.Factory().create_poetry(project)
+        packages = utilities.build_package_map(pypoetry)
+        utilities.find_env_deps(
+            packages, venv, pypoetry, utilities.EnvDeps(dep_names=["requests"])
+        )
+
+    versions = {key[0] for key in utilities._CLOSURES}
+    assert versions == {
+        (str(lockfile), lockfile.stat().st_mtime_ns, lockfile.stat().st_size)
+    }
+
+    utilities.clear_closure_memo()
+
+
+def test_streaming(mock_poetry_factory, mock_venv):
+    """Test that streamed dependencies are checked eagerly and yielded once, leaves first"""
+    pypoetry = poetry.factory.Factory().create_poetry(None)
+    packages = utilities.build_package_map(pypoetry)
+    venv = poetry.utils.env.VirtualEnv()  # pylint: disable=no-value-for-parameter
+
+    with pytest.raises(exceptions.ExtraNotFoundError):
+        utilities.iter_env_deps(
+            packages, venv, pypoetry, utilities.EnvDeps(extras=["no-such-extra"])
+        )
+    with pytest.raises(exceptions.LockedDepNotFoundError):
+        utilities.iter_env_deps(
+            packages, venv, pypoetry, utilities.EnvDeps(dep_names=["no-such-dep"])
+        )
+    with pytest.raises(exceptions.LockedDepVersionConflictError):
+        utilities.iter_env_deps(
+            packages, venv, pypoetry, utilities.EnvDeps(dep_names=["toml==0.10.2"])
+        )
+
+    streamed = utilities.iter_env_deps(
+        packages,
+        venv,
+        pypoetry,
+        utilities.EnvDeps(groups=["dev"], dep_names=["requests", "toml"]),
+    )
+    first = next(streamed)
+    assert not [item for item in first.requires if item.name in packages]
+
+    dependencies = [first, *streamed]
+    assert len(dependencies) == len(set(dependencies))
+    assert dependencies == utilities.find_env_deps(
+        packages,
+        venv,
+        pypoetry,
+        utilities.EnvDeps(groups=["dev"], dep_names=["requests", "toml"]),
+    )
+
+    position = {item.name: index for index, item in enumerate(dependencies)}
+    for package in dependencies:
+        for requirement in package.requires:
+            if requirement.name in position:
+                assert position[requirement.name] < position[package.name]
+
+
+def test_unnormalized_names(mock_poetry_factory, mock_venv):
+    """Test that dependency names are matched to the lockfile regardless of how they are written"""
+    pypoetry = poetry.factory.Factory().create_poetry(None)
+    packages = utilities.build_package_map(pypoetry)
+    venv = poetry.utils.env.VirtualEnv()  # pylint: disable=no-value-for-parameter
+
+    assert utilities.identify_transients(
+        "Python_DateUtil", packages, venv
+    ) == utilities.identify_transients("python-dateutil", packages, venv)
+
+    expected = utilities.find_env_deps(
+        packages,
+        venv,
+        pypoetry,
+        utilities.EnvDeps(dep_names=["python-dateutil", "typing-extensions"]),
+    )
+    assert (
+        utilities.find_env_deps(
+            packages,
+            venv,
+            pypoetry,
+            utilities.EnvDeps(dep_names=["python_dateutil", "Typing.Extensions"]),
+        )
+        == expected
+    )
+    assert utilities.find_project_deps(
+        packages, venv, pypoetry
+    ) == utilities.find_env_deps(packages, venv, pypoetry, utilities.EnvDeps())
+
+
+def test_package_map_unchanged():
+    """Test that resolving requirements missing from the lockfile does not modify the package map
+
+    The map is shared by threads resolving different environments in the install daemon.
+    """
+    package = PoetryPackage("obi-wan", "1.0.0")
+    package.add_dependency(PoetryDependency("midichlorians", "*"))
+    packages = {"obi-wan": [package]}
+
+    assert utilities.identify_transients(
+        "obi-wan", packages, MockEnv(version_info=(3, 10, 0))
+    ) == [package]
+    assert packages == {"obi-wan": [package]}
+
+
+class CountingEnv(MockEnv):
+    """Mock virtualenv that records each marker it evaluates"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evaluated = []
+
+    def is_valid_for_marker(self, marker):
+        self.evaluated.append(marker)
+        return super().is_valid_for_marker(marker)
+
+
+def test_shared_marker_results():
+    """Test that each distinct package marker is evaluated once for each marker environment"""
+    pypoetry = poetry.factory.Factory().create_poetry(TEST_PROJECT_PATH)
+    packages = utilities.build_package_map(pypoetry)
+    first = CountingEnv(version_info=(3, 10, 0))
+    second = CountingEnv(version_info=(3, 10, 0))
+    other = CountingEnv(version_info=(3, 7, 0))
+    distinct = {
+        (package.marker, package.python_versions)
+        for versions in packages.values()
+        for package in versions
+    }
+    utilities.clear_closure_memo()
+
+    expected = utilities.identify_transients("tox", packages, first)
+    assert first.evaluated
+    assert len(first.evaluated) <= len(distinct)
+
+    assert utilities.identify_transients("tox", packages, second) == expected
+    assert not second.evaluated
+
+    utilities.identify_transients("tox", packages, other)
+    assert other.evaluated
+    assert len(other.evaluated) <= len(distinct)
+
+    utilities.clear_closure_memo()
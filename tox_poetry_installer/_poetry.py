@@ -28,15 +28,24 @@ from tox_poetry_installer import exceptions
 
 
 try:
+    from cleo.io.buffered_io import BufferedIO
     from cleo.io.null_io import NullIO
+    from poetry.__version__ import __version__ as POETRY_VERSION
     from poetry.config.config import Config
     from poetry.core.packages.dependency import Dependency as PoetryDependency
     from poetry.core.packages.package import Package as PoetryPackage
+    from poetry.core.utils.helpers import canonicalize_name
     from poetry.factory import Factory
+    from poetry.installation.chooser import Chooser
     from poetry.installation.executor import Executor
     from poetry.installation.operations.install import Install
+    from poetry.installation.wheel_installer import WheelInstaller
     from poetry.poetry import Poetry
+    from poetry.utils.authenticator import Authenticator
+    from poetry.utils.env import EnvCommandError
     from poetry.utils.env import VirtualEnv
+    from poetry.utils.helpers import download_file
+    from poetry.utils.helpers import get_file_hash
 except ImportError:
     raise exceptions.PoetryNotInstalledError(
         f"No version of Poetry could be imported under the current environment for '{sys.executable}'"
@@ -0,0 +1,314 @@
+"""Installer backends for installing locked packages to a virtualenv
+
+Each backend implements the :class:`InstallerBackend` interface and is registered by name in
+:data:`BACKENDS`. The name is what a test environment uses to select the backend with the
+``installer_backend`` config option.
+"""
+# Silence this one globally to support the internal function imports for the proxied poetry module.
+# See the docstring in 'tox_poetry_installer._poetry' for more context.
+# pylint: disable=import-outside-toplevel
+import abc
+import collections
+import threading
+import typing
+from pathlib import Path
+from typing import DefaultDict
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Type
+
+
+from tox_poetry_installer import constants
+from tox_poetry_installer import exceptions
+from tox_poetry_installer import hashes
+from tox_poetry_installer import logger
+from tox_poetry_installer import utilities
+
+if typing.TYPE_CHECKING:
+    from tox_poetry_installer import _poetry
+
+
+class InstallerBackend(abc.ABC):
+    """Interface for installing individual locked packages to a virtualenv
+
+    A backend is created once for each call to :func:`tox_poetry_installer.installer.install`.
+    The :meth:`install` method may be called from multiple threads at once, so any state that is
+    not thread safe should be kept per worker thread in :attr:`workers`.
+
+    :param poetry: Poetry object the packages were sourced from
+    :param venv: Tox virtual environment to install the packages to
+    :param compile_bytecode: Whether to compile the bytecode of each package as it is installed
+    """
+
+    #: Oldest version of Poetry that the backend works with
+    min_poetry_version: Tuple[int, ...] = ()
+
+    def __init__(
+        self,
+        poetry: "_poetry.Poetry",
+        venv: "utilities.InstallEnv",
+        compile_bytecode: bool = False,
+    ):
+        self.poetry = poetry
+        self.venv = venv
+        self.compile_bytecode = compile_bytecode
+        self.workers = threading.local()
+
+    @abc.abstractmethod
+    def install(self, package: "_poetry.PoetryPackage") -> None:
+        """Install a single locked package to the virtualenv
+
+        :param package: Locked package to install
+        """
+
+    def finish(self) -> None:
+        """Save any state kept by the backend once all of the packages have been installed"""
+
+
+class PoetryBackend(InstallerBackend):
+    """Install packages using the Poetry installation executor
+
+    The executor keeps per-run counters and output sections that are reset by every call to
+    ``execute``, so each worker thread is given its own executor rather than sharing one. An
+    executor also shuts itself down after any failed operation and skips every operation it is
+    given afterwards, so an executor is discarded as soon as an install fails.
+
+    The executor reports failures by writing them to its IO rather than raising them, so each
+    executor writes to a buffer that is included in the error raised for a failed install.
+    """
+
+    def __init__(
+        self,
+        poetry: "_poetry.Poetry",
+        venv: "utilities.InstallEnv",
+        compile_bytecode: bool = False,
+    ):
+        super().__init__(poetry, venv, compile_bytecode)
+        self.env = utilities.convert_virtualenv(venv)
+
+    @property
+    def executor(self) -> "_poetry.Executor":
+        """Poetry executor owned by the calling worker thread"""
+        from tox_poetry_installer import _poetry
+
+        executor = getattr(self.workers, "executor", None)
+        if executor is None:
+            # Packages are already spread over the installer's worker threads, so the executor
+            # does not need a thread pool of its own
+            self.workers.output = _poetry.BufferedIO()
+            executor = _poetry.Executor(
+                env=self.env,
+                io=self.workers.output,
+                pool=self.poetry.pool,
+                config=_poetry.Config(),
+                parallel=False,
+            )
+            if self.compile_bytecode:
+                executor.enable_bytecode_compilation()
+            self.workers.executor = executor
+        return executor
+
+    def install(self, package: "_poetry.PoetryPackage") -> None:
+        from tox_poetry_installer import _poetry
+
+        executor = self.executor
+        with artifact_lock(package):
+            failed = executor.execute([_poetry.Install(package=package)])
+        # Only the output of a failed install is of interest, so the buffer is emptied either way
+        output = self.workers.output.fetch_output() + self.workers.output.fetch_error()
+        if failed:
+            self.workers.executor = None
+            raise exceptions.LockedDepsInstallError(
+                f"Poetry failed to install locked dependency {package}:\n{output.strip()}"
+            )
+
+
+class WheelBackend(InstallerBackend):
+    """Install locked wheels by unpacking them directly into the virtualenv
+
+    Wheels are fetched through the Poetry artifact cache, checked against the hashes from the
+    lockfile, and then written to the virtualenv's scheme paths in-process. Packages which do not
+    come from a package index, or which only have an sdist available, are installed using the
+    :class:`PoetryBackend` instead.
+    """
+
+    min_poetry_version = constants.WHEEL_BACKEND_MIN_POETRY_VERSION
+
+    def __init__(
+        self,
+        poetry: "_poetry.Poetry",
+        venv: "utilities.InstallEnv",
+        compile_bytecode: bool = False,
+    ):
+        from tox_poetry_installer import _poetry
+
+        super().__init__(poetry, venv, compile_bytecode)
+        env = utilities.convert_virtualenv(venv)
+        self.config = _poetry.Config()
+        self.fallback = PoetryBackend(poetry, venv, compile_bytecode)
+        self.chooser = _poetry.Chooser(poetry.pool, env, self.config)
+        self.wheel_installer = _poetry.WheelInstaller(env)
+        self.wheel_installer.enable_bytecode_compilation(compile_bytecode)
+        self.hash_cache = hashes.VerifiedHashCache.shared()
+
+    @property
+    def authenticator(self) -> "_poetry.Authenticator":
+        """Authenticated download session owned by the calling worker thread"""
+        from tox_poetry_installer import _poetry
+
+        authenticator = getattr(self.workers, "authenticator", None)
+        if authenticator is None:
+            authenticator = _poetry.Authenticator(self.config, _poetry.NullIO())
+            self.workers.authenticator = authenticator
+        return authenticator
+
+    def install(self, package: "_poetry.PoetryPackage") -> None:
+        from tox_poetry_installer import _poetry
+
+        if package.source_type in constants.NON_INDEX_SOURCE_TYPES:
+            logger.debug(
+                "Using Poetry executor for %s: package source type is '%s'",
+                package,
+                package.source_type,
+            )
+            self.fallback.install(package)
+            return
+
+        link = self.chooser.choose_for(package)
+        if not link.is_wheel:
+            logger.debug(
+                "Using Poetry executor for %s: no compatible wheel is locked", package
+            )
+            self.fallback.install(package)
+            return
+
+        authenticator = self.authenticator
+        with artifact_lock(package):
+            archive = self.poetry.pool.artifact_cache.get_cached_archive_for_link(
+                link,
+                strict=True,
+                download_func=lambda url, dest: _poetry.download_file(
+                    url, dest, session=authenticator
+                ),
+            )
+        verify_archive_hash(archive, package, self.hash_cache)
+        self.wheel_installer.install(archive)
+
+        # The wheel installer records wheels whose RECORD file does not match their contents
+        # rather than raising, and installs them anyway
+        issues = self.wheel_installer.invalid_wheels.pop(archive, None)
+        if issues:
+            raise exceptions.LockedDepsInstallError(
+                f"Wheel '{archive.name}' of locked dependency {package} has an invalid RECORD file:\n"
+                + "\n".join(issues)
+            )
+
+    def finish(self) -> None:
+        self.hash_cache.save()
+
+
+_ARTIFACT_LOCKS: DefaultDict[str, threading.Lock] = collections.defaultdict(
+    threading.Lock
+)
+_ARTIFACT_LOCKS_LOCK = threading.Lock()
+
+
+def artifact_lock(package: "_poetry.PoetryPackage") -> threading.Lock:
+    """Retrieve the lock guarding the cached artifacts of a package
+
+    The Poetry artifact cache is shared by every environment that Tox sets up in the current
+    process, and downloads artifacts straight into the cache. Fetching the same package for two
+    environments at once would have both write the same cache file, so each package is only
+    fetched by one thread at a time; the second thread then finds the artifact already cached.
+
+    :param package: Locked package that is about to be fetched
+    :returns: Lock shared by every backend fetching the same package
+    """
+    with _ARTIFACT_LOCKS_LOCK:
+        return _ARTIFACT_LOCKS[f"{package.unique_name}@{package.source_url}"]
+
+
+BACKENDS: Dict[str, Type[InstallerBackend]] = {
+    "poetry": PoetryBackend,
+    "wheel": WheelBackend,
+}
+
+
+def get_backend(name: str) -> Type[InstallerBackend]:
+    """Retrieve an installer backend by name
+
+    :param name: Name of the backend from the ``installer_backend`` config option
+    :returns: Installer backend class registered under the name
+    :raises InstallerBackendNotFoundError: If no backend is registered under the name, or the
+                                           backend does not support the installed Poetry version
+    """
+    from tox_poetry_installer import _poetry
+
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise exceptions.InstallerBackendNotFoundError(
+            f"Installer backend '{name}' does not exist; valid backends are: {', '.join(sorted(BACKENDS))}"
+        ) from None
+
+    installed = tuple(
+        int(part) for part in _poetry.POETRY_VERSION.split(".")[:2] if part.isdigit()
+    )
+    if installed < backend.min_poetry_version:
+        raise exceptions.InstallerBackendNotFoundError(
+            f"Installer backend '{name}' requires Poetry {'.'.join(str(part) for part in backend.min_poetry_version)} or later, but Poetry {_poetry.POETRY_VERSION} is installed"
+        )
+    return backend
+
+
+def verify_archive_hash(
+    archive: Path,
+    package: "_poetry.PoetryPackage",
+    cache: Optional[hashes.VerifiedHashCache] = None,
+) -> None:
+    """Check that a package artifact matches one of its hashes from the lockfile
+
+    Artifacts that the lockfile does not record a hash for are not checked.
+
+    :param archive: Path to the downloaded package artifact
+    :param package: Locked package the artifact belongs to
+    :param cache: Optional cache of verified artifacts. Artifacts that are unchanged since they
+                  were last verified against a locked hash are not hashed again, and artifacts
+                  that pass the check are added to the cache. The cache is not saved, which is
+                  left to the caller.
+    """
+    from tox_poetry_installer import _poetry
+
+    known_hashes = {
+        item["hash"] for item in package.files if item["file"] == archive.name
+    }
+    if not known_hashes:
+        return
+
+    state: Optional[List[int]] = None
+    if cache is not None:
+        if cache.verified(archive, known_hashes):
+            logger.debug("Skipping hash check of %s: already verified", archive.name)
+            return
+        # Taken before hashing so that changes made to the file while it is hashed are detected
+        state = cache.state(archive)
+
+    locked_types = {item.split(":")[0] for item in known_hashes}
+    hash_type = next(
+        (item for item in constants.LOCKED_HASH_TYPES if item in locked_types), None
+    )
+    if hash_type is None:
+        raise exceptions.LockedDepHashMismatchError(
+            f"No supported hash type found in the lockfile for {package} artifact '{archive.name}'"
+        )
+
+    archive_hash = f"{hash_type}:{_poetry.get_file_hash(archive, hash_type)}"
+    if archive_hash not in known_hashes:
+        raise exceptions.LockedDepHashMismatchError(
+            f"Hash of {package} artifact '{archive.name}' ({archive_hash}) does not match the lockfile"
+        )
+
+    if cache is not None and state is not None:
+        cache.record(archive, archive_hash, state)
@@ -25,3 +25,76 @@ UNSAFE_PACKAGES: Set[str] = set()
 
 # Number of threads to use for installing dependencies by default
 DEFAULT_INSTALL_THREADS: int = 10
+
+# Name of the installer backend used to install locked dependencies when an environment does not
+# specify one
+DEFAULT_INSTALLER_BACKEND: str = "poetry"
+
+# Hash types that lockfiles record for package artifacts, strongest first. An artifact is checked
+# against the strongest type that the lockfile has a hash for.
+LOCKED_HASH_TYPES: Tuple[str, ...] = (
+    "sha3_512",
+    "sha3_384",
+    "sha3_256",
+    "sha3_224",
+    "sha512",
+    "sha384",
+    "sha256",
+    "sha224",
+    "blake2b",
+    "blake2s",
+)
+
+# Oldest version of Poetry that the wheel installer backend works with. Earlier versions of the
+# Poetry artifact cache cannot download artifacts that are not already cached.
+WHEEL_BACKEND_MIN_POETRY_VERSION: Tuple[int, ...] = (1, 7)
+
+# Package source types that are not distributed through a package index and so cannot be
+# installed from a locked wheel artifact
+NON_INDEX_SOURCE_TYPES: Set[str] = {"directory", "file", "git", "url"}
+
+# Number of entries to include in each section of the written profiling summaries
+PROFILE_SUMMARY_ENTRIES: int = 30
+
+# Modes for compiling the bytecode of installed locked dependencies. "none" skips compilation,
+# "per-package" compiles each package as it is installed, and "deferred" compiles every installed
+# package in a single parallel pass once all installs have finished.
+BYTECODE_COMPILATION_MODES: Tuple[str, ...] = ("none", "per-package", "deferred")
+
+# Bytecode compilation mode used by default. Poetry does not compile bytecode by default either.
+DEFAULT_BYTECODE_COMPILATION: str = "none"
+
+# Prefix of the default install daemon socket filename. Outside of the per-user runtime directory
+# the name of the current user is appended so that each user gets their own daemon.
+DAEMON_SOCKET_PREFIX: str = "tox-poetry-installer"
+
+# Seconds to wait for the install daemon to accept a connection, and to answer a request
+DAEMON_CONNECT_TIMEOUT: float = 5.0
+DAEMON_RESPONSE_TIMEOUT: float = 300.0
+
+# Seconds to wait for the install daemon to finish installing the dependencies of an environment
+DAEMON_INSTALL_TIMEOUT: float = 3600.0
+
+# Maximum number of virtualenvs the install daemon keeps loaded at once
+DAEMON_MAX_VENVS: int = 64
+
+# File extension of site-packages layer archives
+LAYER_ARCHIVE_SUFFIX: str = ".tar.gz"
+
+# Name of the archive member that stores the metadata needed to restore a layer
+LAYER_METADATA_NAME: str = ".tox-poetry-installer-layer.json"
+
+# Name of the plugin's directory inside the Poetry cache directory
+CACHE_DIR_NAME: str = "tox-poetry-installer"
+
+# Filename of the record of package artifacts already verified against the lockfile
+VERIFIED_HASHES_FILENAME: str = "verified-hashes.json"
+
+# Filename of the dependencies resolved for each environment from the last version of each lockfile
+RESOLUTION_CACHE_FILENAME: str = "resolved-dependencies.json"
+
+# Filename of the history of package install durations
+INSTALL_HISTORY_FILENAME: str = "install-durations.json"
+
+# Weight given to the latest install duration of a package when updating its smoothed duration
+INSTALL_HISTORY_SMOOTHING: float = 0.5
@@ -0,0 +1,373 @@
+"""Optional long-running install daemon shared across Tox invocations
+
+Every Tox run pays the cost of importing Poetry, loading the project, and parsing the lockfile
+before any locked dependencies can be installed. The daemon is a local process that does this
+work once and keeps the loaded projects, the lockfile package maps, and the resolved dependency
+caches in memory between runs. Start it with::
+
+    tox-poetry-installer-daemon [SOCKET]
+
+While the daemon is listening on the socket given by the ``--daemon-socket`` runtime option,
+the plugin sends its resolve and install requests to the daemon over the socket. If no daemon
+is running the plugin does the work in-process as usual.
+
+Each request and response is a single line of JSON.
+"""
+import argparse
+import collections
+import getpass
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+import typing
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from tox_poetry_installer import backends
+from tox_poetry_installer import constants
+from tox_poetry_installer import durations
+from tox_poetry_installer import exceptions
+from tox_poetry_installer import installer
+from tox_poetry_installer import logger
+from tox_poetry_installer import resolutions
+from tox_poetry_installer import utilities
+
+if typing.TYPE_CHECKING:
+    from tox_poetry_installer import _poetry
+
+
+class DaemonEnv(NamedTuple):
+    """Stand-in for a Tox environment, carrying only what the installer needs"""
+
+    name: str
+    env_dir: Path
+
+
+def default_socket() -> Optional[Path]:
+    """Path of the daemon socket used when none is specified
+
+    The socket is placed in the per-user runtime directory if there is one, which no other user
+    can write to. Otherwise it is placed in the shared temporary directory, where :func:`request`
+    refuses to use a socket that belongs to another user.
+
+    :returns: Path of a socket unique to the current user, or ``None`` if the current user
+              cannot be identified
+    """
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime and Path(runtime).is_dir():
+        return Path(runtime) / f"{constants.DAEMON_SOCKET_PREFIX}.sock"
+
+    try:
+        user = getpass.getuser()
+    except (KeyError, OSError):
+        # Containers often run as a uid with no passwd entry and no ``USER`` variable set
+        if not hasattr(os, "getuid"):
+            return None
+        user = str(os.getuid())
+    return Path(tempfile.gettempdir()) / f"{constants.DAEMON_SOCKET_PREFIX}-{user}.sock"
+
+
+def _trusted(path: Path) -> bool:
+    """Check that a socket can only have been created by, and only be used by, the current user"""
+    try:
+        info = path.stat()
+    except OSError:
+        return False
+
+    if (
+        not hasattr(os, "getuid")
+        or info.st_uid != os.getuid()
+        or stat.S_IMODE(info.st_mode) & 0o077
+    ):
+        logger.warning(
+            f"Not using the install daemon socket {path}: it is not owned by the current user, or other users can access it"
+        )
+        return False
+    return True
+
+
+def request(
+    path: Path,
+    payload: Dict[str, Any],
+    timeout: float = constants.DAEMON_RESPONSE_TIMEOUT,
+) -> Optional[Dict[str, Any]]:
+    """Send a request to the daemon and wait for its response
+
+    :param path: Path to the socket the daemon is listening on
+    :param payload: Request to send to the daemon
+    :param timeout: Seconds to wait for the daemon to respond
+    :returns: Response from the daemon, or ``None`` if no daemon that belongs to the current user
+              is listening on the socket
+    :raises ToxPoetryInstallerException: If the daemon failed to process the request
+    """
+    if not hasattr(socket, "AF_UNIX") or not _trusted(path):
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(constants.DAEMON_CONNECT_TIMEOUT)
+    try:
+        connection.connect(str(path))
+    except OSError:
+        connection.close()
+        return None
+
+    connection.settimeout(timeout)
+    try:
+        with connection, connection.makefile("rwb") as stream:
+            stream.write(json.dumps(payload).encode() + b"\n")
+            stream.flush()
+            response = json.loads(stream.readline() or b"null")
+    except socket.timeout:
+        raise exceptions.DaemonRequestError(
+            f"Install daemon on {path} did not respond within {timeout:.0f} seconds"
+        ) from None
+    except (OSError, ValueError) as err:
+        raise exceptions.DaemonRequestError(
+            f"Failed to communicate with the install daemon on {path}: {err}"
+        ) from None
+
+    if response is None:
+        raise exceptions.DaemonRequestError(
+            "Install daemon closed the connection without responding"
+        )
+
+    if "error" in response:
+        error = getattr(exceptions, response["error"], None)
+        if isinstance(error, type) and issubclass(
+            error, exceptions.ToxPoetryInstallerException
+        ):
+            raise error(response["message"])
+        raise exceptions.DaemonRequestError(
+            f"Install daemon failed to process request: {response['error']}: {response['message']}"
+        )
+
+    return response
+
+
+class Daemon:
+    """Handlers for daemon requests, and the loaded state they share"""
+
+    def __init__(self):
+        self._projects: Dict[
+            str, Tuple[Tuple[int, ...], "_poetry.Poetry", utilities.PackageMap]
+        ] = {}
+        self._venvs: typing.OrderedDict[
+            str, Tuple[int, "_poetry.VirtualEnv"]
+        ] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def handle(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Process a single request
+
+        :param payload: Request received from the plugin
+        :returns: Response to send back to the plugin
+        """
+        action = payload.get("action")
+        if action == "ping":
+            return {"pid": os.getpid()}
+        if action == "resolve":
+            return self.resolve(payload)
+        if action == "install":
+            return self.install(payload)
+        raise exceptions.DaemonRequestError(f"Unknown daemon action '{action}'")
+
+    def project(self, root: str) -> Tuple["_poetry.Poetry", utilities.PackageMap]:
+        """Load a Poetry project, reusing the loaded project while its files are unchanged
+
+        :param root: Root directory of the project
+        :returns: Poetry object for the project and the package map of its lockfile
+        """
+        key = tuple(
+            (Path(root) / name).stat().st_mtime_ns
+            for name in ("pyproject.toml", "poetry.lock")
+            if (Path(root) / name).exists()
+        )
+
+        with self._lock:
+            cached = self._projects.get(root)
+        if cached is not None and cached[0] == key:
+            return cached[1], cached[2]
+
+        logger.info(f"Loading project from {root}")
+        poetry = utilities.load_poetry(Path(root))
+        packages = utilities.build_package_map(poetry)
+        with self._lock:
+            self._projects[root] = (key, poetry, packages)
+        return poetry, packages
+
+    def venv(self, env_dir: str, name: str) -> "_poetry.VirtualEnv":
+        """Load a virtualenv, reusing the loaded virtualenv until it is recreated
+
+        :param env_dir: Path to the virtualenv
+        :param name: Name of the Tox environment the virtualenv belongs to
+        :returns: Poetry virtualenv object, including its cached marker environment
+        """
+        config = Path(env_dir) / "pyvenv.cfg"
+        key = config.stat().st_mtime_ns if config.exists() else 0
+
+        with self._lock:
+            cached = self._venvs.get(env_dir)
+            if cached is not None:
+                self._venvs.move_to_end(env_dir)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        venv = utilities.convert_virtualenv(DaemonEnv(name, Path(env_dir)))
+        with self._lock:
+            self._venvs[env_dir] = (key, venv)
+            self._venvs.move_to_end(env_dir)
+            # Forget the least recently used virtualenvs, which have likely been removed
+            while len(self._venvs) > constants.DAEMON_MAX_VENVS:
+                self._venvs.popitem(last=False)
+        return venv
+
+    def resolve(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Resolve the locked dependencies to install to an environment"""
+        poetry, packages = self.project(payload["tox_root"])
+        dependencies = utilities.find_env_deps(
+            packages,
+            self.venv(payload["env_dir"], payload["env_name"]),
+            poetry,
+            utilities.EnvDeps(
+                payload["poetry_dep_groups"],
+                payload["locked_deps"],
+                payload["extras"],
+                payload["install_project_deps"],
+            ),
+            resolutions.ResolutionCache.shared(),
+        )
+        return {
+            "pyproject": str(poetry.file),
+            "fresh": poetry.locker.is_fresh(),
+            "packages": [[item.name, str(item.version)] for item in dependencies],
+        }
+
+    def install(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Install resolved locked dependencies to an environment"""
+        poetry, packages = self.project(payload["tox_root"])
+        locked: Dict[Tuple[str, str], "_poetry.PoetryPackage"] = {
+            (item.name, str(item.version)): item
+            for options in packages.values()
+            for item in options
+        }
+        dependencies = [
+            locked[(name, version)] for name, version in payload["packages"]
+        ]
+
+        env = DaemonEnv(payload["env_name"], Path(payload["env_dir"]))
+        backend = backends.get_backend(payload["installer_backend"])(
+            poetry, env, payload["bytecode_compilation"] == "per-package"
+        )
+        installer.install(
+            poetry,
+            env,
+            dependencies,
+            payload["parallel_install_threads"],
+            backend=backend,
+            fail_fast=payload["fail_fast"],
+            history=durations.InstallHistory.shared(),
+        )
+        if payload["bytecode_compilation"] == "deferred":
+            installer.compile_bytecode(env)
+
+        return {"installed": len(dependencies)}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Read requests from a connection and write back the daemon's responses"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.daemon.handle(json.loads(line))
+            except Exception as err:  # pylint: disable=broad-except
+                logger.error(f"Failed to process request: {err}")
+                response = {"error": type(err).__name__, "message": str(err)}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+# Unix sockets are not available on every platform (notably Windows), in which case the daemon
+# cannot be started and the plugin always installs in-process
+if hasattr(socket, "AF_UNIX"):
+
+    class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """Threaded Unix socket server for the install daemon
+
+        :param path: Path to the socket to listen on
+        """
+
+        daemon_threads = True
+
+        def __init__(self, path: Path):
+            # Only the user running the daemon should be able to send it requests
+            umask = os.umask(0o177)
+            try:
+                super().__init__(str(path), _RequestHandler)
+            finally:
+                os.umask(umask)
+            self.daemon = Daemon()
+
+
+def serve(path: Path) -> None:
+    """Run the install daemon until it is interrupted
+
+    :param path: Path to the socket to listen on
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise exceptions.DaemonRequestError(
+            "The install daemon requires Unix socket support, which is not available on this platform"
+        )
+
+    if path.exists():
+        if request(path, {"action": "ping"}) is not None:
+            raise exceptions.DaemonRequestError(
+                f"An install daemon is already listening on {path}"
+            )
+        path.unlink()
+
+    server = DaemonServer(path)
+    logger.info(f"Install daemon listening on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def main() -> None:
+    """Command line entrypoint for the install daemon"""
+    parser = argparse.ArgumentParser(
+        description="Keep Poetry projects loaded between Tox runs",
+    )
+    parser.add_argument(
+        "socket",
+        nargs="?",
+        type=Path,
+        default=default_socket(),
+        help="Path to the socket to listen on (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    if args.socket is None:
+        parser.error("the current user cannot be identified, so a socket must be given")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""History of how long each locked package took to install
+
+The installer uses the history to start the packages that take the longest to install first,
+so that a slow sdist build or a very large wheel does not start last and leave the whole
+environment waiting on a single straggling worker thread. Durations are recorded for each
+package name, version, and interpreter ABI, since building or unpacking the same package can
+take very different amounts of time for different interpreters. The history is kept in a JSON
+file in the plugin's cache directory.
+"""
+import typing
+from typing import Optional
+
+from tox_poetry_installer import constants
+from tox_poetry_installer import utilities
+
+if typing.TYPE_CHECKING:
+    from tox_poetry_installer import _poetry
+
+
+class InstallHistory(utilities.JsonStore):
+    """Smoothed install durations of previously installed packages
+
+    :param path: JSON file to persist the history to, or ``None`` to only keep it in memory
+    """
+
+    filename = constants.INSTALL_HISTORY_FILENAME
+    description = "install history"
+
+    @staticmethod
+    def _key(package: "_poetry.PoetryPackage", abi: str) -> str:
+        return f"{package.name}=={package.version}@{abi}"
+
+    def estimate(self, package: "_poetry.PoetryPackage", abi: str) -> Optional[float]:
+        """Estimate how long a package will take to install
+
+        :param package: Locked package to estimate the install duration of
+        :param abi: ABI tag of the environment the package will be installed to
+        :returns: Estimated duration in seconds, or ``None`` if the package has no history
+        """
+        with self._lock:
+            return self._load().get(self._key(package, abi))
+
+    def record(
+        self, package: "_poetry.PoetryPackage", abi: str, duration: float
+    ) -> None:
+        """Record how long a package took to install
+
+        :param package: Locked package that was installed
+        :param abi: ABI tag of the environment the package was installed to
+        :param duration: Time taken to install the package, in seconds
+        """
+        key = self._key(package, abi)
+        with self._lock:
+            durations = self._load()
+            previous = durations.get(key)
+            if previous is not None:
+                duration = (
+                    constants.INSTALL_HISTORY_SMOOTHING * duration
+                    + (1 - constants.INSTALL_HISTORY_SMOOTHING) * previous
+                )
+            durations[key] = duration
+            self._updated[key] = duration
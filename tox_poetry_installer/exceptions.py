@@ -12,6 +12,10 @@ All exceptions should inherit from the common base exception :exc:`ToxPoetryInst
    +-- ExtraNotFoundError
    +-- LockedDepsRequiredError
    +-- RequiresUnsafeDepError
+   +-- InstallerBackendNotFoundError
+   +-- LockedDepHashMismatchError
+   +-- LockedDepsInstallError
+   +-- DaemonRequestError
 
 """
 
@@ -46,3 +50,19 @@ class LockedDepsRequiredError(ToxPoetryInstallerException):
 
 class RequiresUnsafeDepError(ToxPoetryInstallerException):
     """Package under test depends on an unsafe dependency and cannot be installed"""
+
+
+class InstallerBackendNotFoundError(ToxPoetryInstallerException):
+    """Environment specifies an installer backend that does not exist"""
+
+
+class LockedDepHashMismatchError(ToxPoetryInstallerException):
+    """Artifact for a locked dependency does not match any of the hashes from the lockfile"""
+
+
+class LockedDepsInstallError(ToxPoetryInstallerException):
+    """One or more locked dependencies failed to install to the environment"""
+
+
+class DaemonRequestError(ToxPoetryInstallerException):
+    """Install daemon failed to process a request"""
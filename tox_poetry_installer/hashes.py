@@ -0,0 +1,77 @@
+"""Cache of package artifacts that have already been checked against the lockfile
+
+Checking an artifact against its locked hash means reading and hashing the whole file, which
+for large wheels takes far longer than installing them. Once an artifact has passed the check
+its path is recorded along with the size, modification time, and inode of the file and the hash
+it matched. Later installs of the same unchanged file, in any environment and any run, then
+only need to ``stat`` it. The record is kept in a JSON file in the plugin's cache directory,
+which is written once at the end of each install run.
+"""
+from pathlib import Path
+from typing import Collection
+from typing import List
+
+from tox_poetry_installer import constants
+from tox_poetry_installer import logger
+from tox_poetry_installer import utilities
+
+
+class VerifiedHashCache(utilities.JsonStore):
+    """Record of artifacts whose hash has been verified against the lockfile
+
+    :param path: JSON file to persist the record to, or ``None`` to only keep it in memory
+    """
+
+    filename = constants.VERIFIED_HASHES_FILENAME
+    description = "verified hash cache"
+
+    @staticmethod
+    def state(archive: Path) -> List[int]:
+        """Identify the current contents of an artifact without reading it
+
+        :param archive: Path to the package artifact
+        :returns: Size, modification time, and inode of the artifact's file
+        """
+        info = archive.stat()
+        return [info.st_size, info.st_mtime_ns, info.st_ino]
+
+    def verified(self, archive: Path, known_hashes: Collection[str]) -> bool:
+        """Check whether an artifact was already verified against one of its locked hashes
+
+        :param archive: Path to the package artifact
+        :param known_hashes: Hashes of the artifact recorded in the lockfile
+        :returns: Whether the artifact is unchanged since it matched one of the known hashes
+        """
+        with self._lock:
+            entry = self._load().get(str(archive))
+        if entry is None or entry[3] not in known_hashes:
+            return False
+        try:
+            return entry[:3] == self.state(archive)
+        except OSError:
+            return False
+
+    def record(self, archive: Path, archive_hash: str, state: List[int]) -> None:
+        """Record that an artifact matched a locked hash
+
+        :param archive: Path to the package artifact
+        :param archive_hash: Locked hash that the artifact matched, as ``<type>:<digest>``
+        :param state: State of the artifact from :meth:`state`, taken before it was hashed. If
+                      the file has changed since then the hash may not be of its current
+                      contents, so nothing is recorded.
+        """
+        try:
+            current = self.state(archive)
+        except OSError:
+            current = None
+        if current != state:
+            logger.debug(
+                "Not recording hash of %s: file changed while it was hashed",
+                archive.name,
+            )
+            return
+
+        entry = [*state, archive_hash]
+        with self._lock:
+            self._load()[str(archive)] = entry
+            self._updated[str(archive)] = entry
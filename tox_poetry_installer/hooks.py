@@ -4,20 +4,34 @@ All implementations of tox hooks are defined here, as well as any single-use hel
 specifically related to implementing the hooks (to keep the size/readability of the hook functions
 themselves manageable).
 """
-from itertools import chain
+import typing
+from pathlib import Path
+from typing import Iterable
 from typing import List
+from typing import Optional
+from typing import Type
 
 from tox.config.cli.parser import ToxParser
 from tox.config.sets import EnvConfigSet
 from tox.plugin import impl
 from tox.tox_env.api import ToxEnv as ToxVirtualEnv
+from tox.tox_env.package import PackageToxEnv
 
+from tox_poetry_installer import backends
 from tox_poetry_installer import constants
+from tox_poetry_installer import daemon
+from tox_poetry_installer import durations
 from tox_poetry_installer import exceptions
 from tox_poetry_installer import installer
+from tox_poetry_installer import layers
 from tox_poetry_installer import logger
+from tox_poetry_installer import profiling
+from tox_poetry_installer import resolutions
 from tox_poetry_installer import utilities
 
+if typing.TYPE_CHECKING:
+    from tox_poetry_installer import _poetry
+
 
 @impl
 def tox_add_option(parser: ToxParser):
@@ -37,6 +51,55 @@ def tox_add_option(parser: ToxParser):
         help="Number of locked dependencies to install simultaneously; set to 0 to disable parallel installation",
     )
 
+    parser.add_argument(
+        "--collect-install-failures",
+        action="store_true",
+        dest="collect_install_failures",
+        help="Attempt to install every locked dependency and report all failures, instead of stopping at the first failure",
+    )
+
+    parser.add_argument(
+        "--bytecode-compilation",
+        choices=constants.BYTECODE_COMPILATION_MODES,
+        dest="bytecode_compilation",
+        default=constants.DEFAULT_BYTECODE_COMPILATION,
+        help="When to compile bytecode for locked dependencies: never, as each package is installed, or in one parallel pass after all packages are installed",
+    )
+
+    parser.add_argument(
+        "--profile-dir",
+        type=Path,
+        of_type=Path,
+        dest="profile_dir",
+        default=None,
+        help="Profile the plugin's dependency resolution and installation for each environment, writing the results to this directory",
+    )
+
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        dest="profile_memory",
+        help="Also trace peak memory usage during dependency resolution; requires --profile-dir",
+    )
+
+    parser.add_argument(
+        "--layer-dir",
+        type=Path,
+        of_type=Path,
+        dest="layer_dir",
+        default=None,
+        help="Directory to save snapshots of installed locked dependencies to, and to restore matching snapshots from instead of installing",
+    )
+
+    parser.add_argument(
+        "--daemon-socket",
+        type=Path,
+        of_type=Path,
+        dest="daemon_socket",
+        default=None,
+        help="Socket of the install daemon to hand resolution and installation to, if it is running (default: a per-user socket in the temporary directory)",
+    )
+
 
 @impl
 def tox_add_env_config(env_conf: EnvConfigSet):
@@ -76,6 +139,13 @@ def tox_add_env_config(env_conf: EnvConfigSet):
         desc="List of locked dependencies to install to the environment using the Poetry lockfile",
     )
 
+    env_conf.add_config(
+        "installer_backend",
+        of_type=str,
+        default=constants.DEFAULT_INSTALLER_BACKEND,
+        desc="Name of the backend to use for installing locked dependencies to the environment",
+    )
+
 
 @impl
 def tox_on_install(
@@ -90,6 +160,26 @@ def tox_on_install(
     :param venv: Tox virtual environment object with configuration for the local Tox environment.
     :param action: Tox action object
     """
+    if tox_env.options.profile_memory and tox_env.options.profile_dir is None:
+        logger.warning(
+            "Ignoring the '--profile-memory' runtime option, which requires '--profile-dir' to be set"
+        )
+
+    if (
+        not isinstance(tox_env, PackageToxEnv)
+        and tox_env.options.profile_dir is None
+        and tox_env.options.layer_dir is None
+    ):
+        try:
+            if _install_with_daemon(tox_env):
+                return
+        except exceptions.SkipEnvironment as err:
+            logger.info(str(err))
+            return
+        except exceptions.ToxPoetryInstallerException as err:
+            logger.error(str(err))
+            raise err
+
     try:
         poetry = utilities.check_preconditions(tox_env)
     except exceptions.SkipEnvironment as err:
@@ -111,65 +201,178 @@ def tox_on_install(
             f"The Poetry lock file is not up to date with the latest changes in {poetry.file}"
         )
 
-    try:
-        if tox_env.conf["require_locked_deps"] and tox_env.conf["deps"].lines():
-            raise exceptions.LockedDepsRequiredError(
-                f"Unlocked dependencies '{tox_env.conf['deps']}' specified for environment '{tox_env.name}' which requires locked dependencies"
-            )
+    with profiling.profile(
+        tox_env.options.profile_dir,
+        f"{tox_env.name}-resolve",
+        tox_env.options.profile_memory,
+    ) as profiler, profiler.thread():
+        try:
+            if tox_env.conf["require_locked_deps"] and tox_env.conf["deps"].lines():
+                raise exceptions.LockedDepsRequiredError(
+                    f"Unlocked dependencies '{tox_env.conf['deps']}' specified for environment '{tox_env.name}' which requires locked dependencies"
+                )
 
-        packages = utilities.build_package_map(poetry)
+            backend = backends.get_backend(tox_env.conf["installer_backend"])
 
-        group_deps = utilities.dedupe_packages(
-            list(
-                chain(
-                    *[
-                        utilities.find_group_deps(group, packages, virtualenv, poetry)
-                        for group in tox_env.conf["poetry_dep_groups"]
-                    ]
-                )
+            packages = utilities.build_package_map(poetry)
+
+            dependencies: Iterable["_poetry.PoetryPackage"] = utilities.iter_env_deps(
+                packages,
+                virtualenv,
+                poetry,
+                utilities.EnvDeps(
+                    tox_env.conf["poetry_dep_groups"],
+                    tox_env.conf["locked_deps"],
+                    _get_extras(tox_env),
+                    tox_env.conf["install_project_deps"],
+                ),
+                resolutions.ResolutionCache.shared(),
             )
+
+            # Dependencies are streamed to the installer as they are resolved, unless the full
+            # set is needed up front to look up its layer or to profile resolution on its own
+            if (
+                tox_env.options.layer_dir is not None
+                or tox_env.options.profile_dir is not None
+            ):
+                dependencies = list(dependencies)
+        except exceptions.ToxPoetryInstallerException as err:
+            logger.error(str(err))
+            raise err
+        except Exception as err:
+            logger.error(f"Internal plugin error: {err}")
+            raise err
+
+    _install_locked(tox_env, poetry, virtualenv, backend, dependencies)
+
+
+def _install_locked(
+    tox_env: ToxVirtualEnv,
+    poetry: "_poetry.Poetry",
+    virtualenv: "_poetry.VirtualEnv",
+    backend: Type[backends.InstallerBackend],
+    dependencies: Iterable["_poetry.PoetryPackage"],
+) -> None:
+    """Install the resolved locked dependencies of an environment
+
+    If a layer directory is configured, the dependencies are restored from a matching layer
+    instead when there is one, and otherwise a new layer is captured as they are installed.
+
+    :param tox_env: Tox virtual environment to install the locked dependencies to
+    :param poetry: Poetry object for the current project
+    :param virtualenv: Poetry virtual environment for the Tox environment
+    :param backend: Installer backend to install each dependency with
+    :param dependencies: Locked dependencies to install, which may be a lazy iterator unless a
+                         layer directory is configured
+    """
+    layer: Optional[Path] = None
+    if tox_env.options.layer_dir is not None:
+        layer = tox_env.options.layer_dir / layers.layer_name(
+            list(dependencies), virtualenv, tox_env.options.bytecode_compilation
         )
+        if layers.restore(layer, virtualenv):
+            return
+
+    if isinstance(dependencies, list):
         logger.info(
-            f"Identified {len(group_deps)} group dependencies to install to env"
+            f"Installing {len(dependencies)} dependencies from Poetry lock file"
         )
-
-        env_deps = utilities.find_additional_deps(
-            packages, virtualenv, poetry, tox_env.conf["locked_deps"]
+    else:
+        logger.info(
+            "Installing dependencies from Poetry lock file as they are resolved"
+        )
+    with profiling.profile(
+        tox_env.options.profile_dir, f"{tox_env.name}-install"
+    ) as profiler, layers.capture(layer, virtualenv):
+        installer.install(
+            poetry,
+            tox_env,
+            dependencies,
+            tox_env.options.parallel_install_threads,
+            backend=backend(
+                poetry,
+                tox_env,
+                tox_env.options.bytecode_compilation == "per-package",
+            ),
+            fail_fast=not tox_env.options.collect_install_failures,
+            profiler=profiler,
+            history=durations.InstallHistory.shared(),
         )
+        if tox_env.options.bytecode_compilation == "deferred":
+            with profiler.thread():
+                installer.compile_bytecode(tox_env)
 
-        logger.info(
-            f"Identified {len(env_deps)} environment dependencies to install to env"
+
+def _get_extras(tox_env: ToxVirtualEnv) -> List[str]:
+    """Retrieve the extras of an environment, which are not set if ``skip_install=true``"""
+    try:
+        return tox_env.conf["extras"]
+    except KeyError:
+        return []
+
+
+def _install_with_daemon(tox_env: ToxVirtualEnv) -> bool:
+    """Hand resolution and installation of the locked dependencies to the install daemon
+
+    :param tox_env: Tox virtual environment to install the locked dependencies to
+    :returns: Whether the daemon installed the dependencies; ``False`` if no daemon is running
+    """
+    path = tox_env.options.daemon_socket or daemon.default_socket()
+    if path is None:
+        logger.debug("Unable to identify the current user, installing in-process")
+        return False
+
+    payload = {
+        "tox_root": str(tox_env.core["tox_root"]),
+        "env_name": tox_env.name,
+        "env_dir": str(tox_env.env_dir),
+    }
+    resolved = daemon.request(
+        path,
+        {
+            "action": "resolve",
+            "poetry_dep_groups": tox_env.conf["poetry_dep_groups"],
+            "locked_deps": tox_env.conf["locked_deps"],
+            "extras": sorted(_get_extras(tox_env)),
+            "install_project_deps": tox_env.conf["install_project_deps"],
+            **payload,
+        },
+    )
+    if resolved is None:
+        logger.debug(f"No install daemon listening on {path}, installing in-process")
+        return False
+
+    # Only checked once the daemon has loaded the project, so that environments which the plugin
+    # skips are skipped the same way as when installing in-process
+    if tox_env.conf["require_locked_deps"] and tox_env.conf["deps"].lines():
+        raise exceptions.LockedDepsRequiredError(
+            f"Unlocked dependencies '{tox_env.conf['deps']}' specified for environment '{tox_env.name}' which requires locked dependencies"
         )
 
-        # extras are not set in a testenv if skip_install=true
-        try:
-            extras = tox_env.conf["extras"]
-        except KeyError:
-            extras = []
+    logger.info(f"Loaded project pyproject.toml from {resolved['pyproject']}")
+    if not resolved["fresh"]:
+        logger.warning(
+            f"The Poetry lock file is not up to date with the latest changes in {resolved['pyproject']}"
+        )
 
-        if tox_env.conf["install_project_deps"]:
-            project_deps = utilities.find_project_deps(
-                packages, virtualenv, poetry, extras
-            )
-            logger.info(
-                f"Identified {len(project_deps)} project dependencies to install to env"
-            )
-        else:
-            project_deps = []
-            logger.info("Env does not install project package dependencies, skipping")
-    except exceptions.ToxPoetryInstallerException as err:
-        logger.error(str(err))
-        raise err
-    except Exception as err:
-        logger.error(f"Internal plugin error: {err}")
-        raise err
-
-    dependencies = utilities.dedupe_packages(group_deps + env_deps + project_deps)
-
-    logger.info(f"Installing {len(dependencies)} dependencies from Poetry lock file")
-    installer.install(
-        poetry,
-        tox_env,
-        dependencies,
-        tox_env.options.parallel_install_threads,
+    logger.info(
+        f"Installing {len(resolved['packages'])} dependencies from Poetry lock file using the install daemon"
     )
+    installed = daemon.request(
+        path,
+        {
+            "action": "install",
+            "packages": resolved["packages"],
+            "installer_backend": tox_env.conf["installer_backend"],
+            "parallel_install_threads": tox_env.options.parallel_install_threads,
+            "fail_fast": not tox_env.options.collect_install_failures,
+            "bytecode_compilation": tox_env.options.bytecode_compilation,
+            **payload,
+        },
+        timeout=constants.DAEMON_INSTALL_TIMEOUT,
+    )
+    if installed is None:
+        raise exceptions.DaemonRequestError(
+            f"Install daemon on {path} stopped before installing dependencies"
+        )
+    return True
@@ -4,14 +4,27 @@
 # pylint: disable=import-outside-toplevel
 import concurrent.futures
 import contextlib
+import heapq
+import math
+import threading
+import time
 import typing
 from datetime import datetime
+from typing import Callable
 from typing import Collection
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
 from typing import Set
+from typing import Tuple
 
-from tox.tox_env.api import ToxEnv as ToxVirtualEnv
 
+from tox_poetry_installer import backends
+from tox_poetry_installer import durations
+from tox_poetry_installer import exceptions
 from tox_poetry_installer import logger
+from tox_poetry_installer import profiling
 from tox_poetry_installer import utilities
 
 if typing.TYPE_CHECKING:
@@ -20,69 +33,286 @@ if typing.TYPE_CHECKING:
 
 def install(
     poetry: "_poetry.Poetry",
-    venv: ToxVirtualEnv,
-    packages: Collection["_poetry.PoetryPackage"],
+    venv: "utilities.InstallEnv",
+    packages: Iterable["_poetry.PoetryPackage"],
     parallels: int = 0,
+    *,
+    backend: Optional[backends.InstallerBackend] = None,
+    fail_fast: bool = True,
+    profiler: Optional[profiling.Profiler] = None,
+    history: Optional[durations.InstallHistory] = None,
 ):
     """Install a bunch of packages to a virtualenv
 
     :param poetry: Poetry object the packages were sourced from
     :param venv: Tox virtual environment to install the packages to
-    :param packages: List of packages to install to the virtual environment
+    :param packages: Packages to install to the virtual environment. This may be a lazy
+                     iterator, in which case each package is queued for installation as soon as
+                     it is produced while the remaining packages are still being resolved.
     :param parallels: Number of parallel processes to use for installing dependency packages, or
                       ``None`` to disable parallelization.
+    :param backend: Installer backend to use for installing each package. Defaults to a
+                    :class:`backends.PoetryBackend` for the virtual environment.
+    :param fail_fast: Whether to cancel all pending installs as soon as one package fails to
+                      install. If disabled, every package is attempted and all failures are
+                      reported together.
+    :param profiler: Optional profiler to profile the installation of each package with
+    :param history: Optional history of install durations. When given, each worker starts
+                    whichever waiting package is expected to take the longest to install, and
+                    the install duration of each package is added to the history. Locked
+                    packages are installed without their dependencies, so no package has to
+                    wait for another to be installed first, although a package that is still
+                    being resolved is not yet waiting.
     """
-    from tox_poetry_installer import _poetry
-
-    logger.info(f"Installing {len(packages)} packages to environment at {venv.env_dir}")
+    if isinstance(packages, Collection):
+        logger.info(
+            f"Installing {len(packages)} packages to environment at {venv.env_dir}"
+        )
+    else:
+        logger.info(
+            f"Installing packages to environment at {venv.env_dir} as they are resolved"
+        )
 
-    install_executor = _poetry.Executor(
-        env=utilities.convert_virtualenv(venv),
-        io=_poetry.NullIO(),
-        pool=poetry.pool,
-        config=_poetry.Config(),
+    install_backend = backend or backends.PoetryBackend(poetry, venv)
+    workers = _Workers(
+        install_backend,
+        profiler or profiling.Profiler(enabled=False),
+        history,
+        utilities.abi_tag(utilities.convert_virtualenv(venv))
+        if history is not None
+        else "",
     )
 
-    installed: Set[_poetry.PoetryPackage] = set()
+    try:
+        with _optional_parallelize(parallels) as executor:
+            futures, skipped = workers.schedule(packages, executor, fail_fast)
+            logger.debug("Waiting for installs to finish...")
+            for future in concurrent.futures.as_completed(futures):
+                if fail_fast and future.exception() is not None:
+                    for pending in futures:
+                        pending.cancel()
+                    break
+    finally:
+        install_backend.finish()
+        if history is not None:
+            history.save()
+
+    _report(futures, workers.waiting.assigned, skipped, fail_fast)
+
+
+class _Waiting:
+    """Packages waiting for a worker, ordered by priority
+
+    Each queued task installs whichever waiting package has the highest priority when the task
+    starts, rather than the package that was waiting when the task was queued.
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, int, "_poetry.PoetryPackage"]] = []
+        self._lock = threading.Lock()
+        self.assigned: Dict[int, "_poetry.PoetryPackage"] = {}
+
+    def push(
+        self, priority: float, token: int, dependency: "_poetry.PoetryPackage"
+    ) -> None:
+        """Add a package to wait for the task with the given token"""
+        with self._lock:
+            heapq.heappush(self._heap, (priority, token, dependency))
+
+    def pop(self, token: int) -> "_poetry.PoetryPackage":
+        """Take the waiting package with the highest priority for the task with the given token"""
+        with self._lock:
+            _, _, dependency = heapq.heappop(self._heap)
+            self.assigned[token] = dependency
+        return dependency
 
-    def logged_install(dependency: _poetry.PoetryPackage) -> None:
-        start = datetime.now()
-        logger.debug(f"Installing {dependency}")
-        install_executor.execute([_poetry.Install(package=dependency)])
-        end = datetime.now()
-        logger.debug(f"Finished installing {dependency} in {end - start}")
 
-    @contextlib.contextmanager
-    def _optional_parallelize():
-        """A bit of cheat, really
+class _Workers:
+    """Queue packages for installation and install them on the worker threads
 
-        A context manager that exposes a common interface for the caller that optionally
-        enables/disables the usage of the parallel thread pooler depending on the value of
-        the ``parallels`` parameter.
+    :param backend: Installer backend to install each package with
+    :param profiler: Profiler to profile the installation of each package with
+    :param history: Optional history of install durations to prioritize packages with and to
+                    record the install durations to
+    :param abi: ABI tag of the virtualenv, which install durations are recorded for
+    """
+
+    def __init__(
+        self,
+        backend: backends.InstallerBackend,
+        profiler: profiling.Profiler,
+        history: Optional[durations.InstallHistory],
+        abi: str,
+    ):
+        self.backend = backend
+        self.profiler = profiler
+        self.history = history
+        self.abi = abi
+        self.waiting = _Waiting()
+        self.failed = threading.Event()
+        # Only time installs if the duration is going to be used
+        self.timed = history is not None or logger.is_debug()
+
+    def priority(self, dependency: "_poetry.PoetryPackage") -> float:
+        """Priority of a waiting package, where lower values are installed first"""
+        if self.history is None:
+            return 0.0
+        estimate = self.history.estimate(dependency, self.abi)
+        # Packages without any history could be slow to build, so they are started first
+        return -math.inf if estimate is None else -estimate
+
+    def schedule(
+        self,
+        packages: Iterable["_poetry.PoetryPackage"],
+        executor: Callable[..., concurrent.futures.Future],
+        fail_fast: bool,
+    ) -> Tuple[Dict[concurrent.futures.Future, int], int]:
+        """Queue a task to install each distinct package
+
+        :param packages: Packages to install, which may be a lazy iterator
+        :param executor: Function to submit each task with
+        :param fail_fast: Whether to stop queuing packages once a package fails to install
+        :returns: Token of the task queued for each package keyed by its future, and the number
+                  of packages that were not queued because an install failed
         """
-        if parallels > 0:
-            with concurrent.futures.ThreadPoolExecutor(
-                max_workers=parallels
-            ) as executor:
-                yield executor.submit
+        futures: Dict[concurrent.futures.Future, int] = {}
+        seen: Set["_poetry.PoetryPackage"] = set()
+        skipped = 0
+        try:
+            for dependency in packages:
+                if dependency in seen:
+                    logger.debug("Skipping %s, already installed", dependency)
+                    continue
+                seen.add(dependency)
+                if fail_fast and self.failed.is_set():
+                    if not skipped:
+                        logger.debug(
+                            "Install failure detected, not queuing further packages"
+                        )
+                    skipped += 1
+                    continue
+                logger.debug("Queuing %s", dependency)
+                token = len(futures)
+                self.waiting.push(self.priority(dependency), token, dependency)
+                futures[executor(self.install_next, token)] = token
+        except Exception as err:
+            # Resolution of a lazily resolved set of packages failed, so nothing that is still
+            # queued should be installed
+            logger.error(str(err))
+            for pending in futures:
+                pending.cancel()
+            raise
+        return futures, skipped
+
+    def install_next(self, token: int) -> None:
+        """Install the waiting package with the highest priority"""
+        dependency = self.waiting.pop(token)
+        # Logged straight away so that an install which hangs can be identified
+        logger.debug("Installing %s", dependency)
+        start = time.perf_counter() if self.timed else 0.0
+        try:
+            with self.profiler.thread():
+                self.backend.install(dependency)
+        except Exception:
+            self.failed.set()
+            raise
+        if self.timed:
+            duration = time.perf_counter() - start
+            logger.debug("Finished installing %s in %.3fs", dependency, duration)
+            if self.history is not None:
+                self.history.record(dependency, self.abi, duration)
+
+
+def _sequential(func, arg) -> concurrent.futures.Future:
+    """Run a function immediately, storing the outcome in a completed future"""
+    future: concurrent.futures.Future = concurrent.futures.Future()
+    try:
+        future.set_result(func(arg))
+    except Exception as err:  # pylint: disable=broad-except
+        future.set_exception(err)
+    return future
+
+
+@contextlib.contextmanager
+def _optional_parallelize(parallels: int):
+    """A bit of cheat, really
+
+    A context manager that exposes a common interface for the caller that optionally
+    enables/disables the usage of the parallel thread pooler depending on the value of
+    the ``parallels`` parameter.
+    """
+    if parallels > 0:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=parallels) as executor:
+            yield executor.submit
+    else:
+        yield _sequential
+
+
+def _report(
+    futures: Dict[concurrent.futures.Future, int],
+    assigned: Dict[int, "_poetry.PoetryPackage"],
+    skipped: int,
+    fail_fast: bool,
+) -> None:
+    """Report the packages that failed to install, if any, and raise the install failure
+
+    :param futures: Token of the task queued for each package keyed by its future
+    :param assigned: Package installed by each task keyed by its token
+    :param skipped: Number of packages that were never queued because an install failed
+    :param fail_fast: Whether to raise the first failure as-is rather than a combined failure
+    """
+    completed = 0
+    cancelled = skipped
+    failures: List[Tuple["_poetry.PoetryPackage", BaseException]] = []
+    for future, token in futures.items():
+        if future.cancelled():
+            cancelled += 1
+        elif future.exception() is not None:
+            failures.append((assigned[token], future.exception()))
         else:
-            yield lambda func, arg: func(arg)
-
-    with _optional_parallelize() as executor:
-        futures = []
-        for dependency in packages:
-            if dependency not in installed:
-                installed.add(dependency)
-                logger.debug(f"Queuing {dependency}")
-                future = executor(logged_install, dependency)
-                if future is not None:
-                    futures.append(future)
-            else:
-                logger.debug(f"Skipping {dependency}, already installed")
-        logger.debug("Waiting for installs to finish...")
-
-        for future in concurrent.futures.as_completed(futures):
-            # Don't actually care about the return value, just waiting on the
-            # future to ensure any exceptions that were raised in the called
-            # function are propagated.
-            future.result()
+            completed += 1
+
+    if not failures:
+        return
+
+    logger.error(
+        f"Failed to install {len(failures)} packages ({completed} completed, {cancelled} cancelled)"
+    )
+    for dependency, failure in failures:
+        logger.error(f"Failed to install {dependency}: {failure}")
+
+    if fail_fast or len(failures) == 1:
+        raise failures[0][1]
+    raise exceptions.LockedDepsInstallError(
+        f"Failed to install {len(failures)} locked dependencies: {', '.join(str(dependency) for dependency, _ in failures)}"
+    ) from failures[0][1]
+
+
+def compile_bytecode(venv: "utilities.InstallEnv") -> None:
+    """Compile the bytecode of every package installed to a virtualenv in a single pass
+
+    Compilation is run by the virtualenv's own interpreter so that the bytecode matches its
+    Python version, and is spread over a process pool with one worker per CPU. Files with
+    up-to-date bytecode are skipped, so only newly installed files are compiled.
+
+    Files that cannot be compiled, such as the Python 2 only test fixtures that some packages
+    ship, are skipped with a warning rather than failing the environment, in the same way that
+    pip skips them.
+
+    :param venv: Tox virtual environment to compile the installed packages of
+    """
+    from tox_poetry_installer import _poetry
+
+    env = utilities.convert_virtualenv(venv)
+    paths = list(dict.fromkeys([env.paths["purelib"], env.paths["platlib"]]))
+
+    logger.info(f"Compiling bytecode for packages installed to {venv.env_dir}")
+    start = datetime.now()
+    try:
+        env.run("python", "-m", "compileall", "-q", "-j", "0", *paths)
+    except _poetry.EnvCommandError as err:
+        logger.warning(
+            f"Some files installed to {venv.env_dir} could not be compiled to bytecode"
+        )
+        logger.debug(err.e.output or "")
+    logger.debug(f"Finished compiling bytecode in {datetime.now() - start}")
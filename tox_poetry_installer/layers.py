@@ -0,0 +1,178 @@
+"""Portable snapshots of the locked dependencies installed to a virtualenv
+
+A layer is a compressed archive of every file that installing an environment's locked
+dependencies added to its virtualenv. Layers are named after a fingerprint of the resolved
+packages and the ABI of the virtualenv's interpreter, so an environment with the same resolved
+dependencies on a compatible interpreter can restore the layer instead of installing each
+package again. Layers are enabled by passing a directory to store them in with the
+``--layer-dir`` runtime option, which is intended to be persisted with a CI cache.
+
+Console scripts record the absolute path of the interpreter that they were installed for, so
+their shebangs are rewritten to the new interpreter when a layer is restored. Other absolute
+paths, such as those written by editable installs of path dependencies, are restored as-is.
+"""
+import contextlib
+import hashlib
+import io
+import json
+import os
+import stat
+import tarfile
+import tempfile
+import typing
+from pathlib import Path
+from pathlib import PurePosixPath
+from typing import Dict
+from typing import Iterator
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from tox_poetry_installer import constants
+from tox_poetry_installer import logger
+from tox_poetry_installer import utilities
+
+if typing.TYPE_CHECKING:
+    from tox_poetry_installer import _poetry
+
+
+def layer_name(
+    packages: Sequence["_poetry.PoetryPackage"],
+    env: "_poetry.VirtualEnv",
+    variant: str = "",
+) -> str:
+    """Build the name of the layer for a set of resolved packages
+
+    :param packages: Resolved locked packages that the layer contains
+    :param env: Poetry virtualenv that the packages are installed to
+    :param variant: Any other setting that changes the installed files, such as the bytecode
+                    compilation mode
+    :returns: Archive filename of the layer
+    """
+    fingerprint = hashlib.sha256(variant.encode())
+    for package in sorted(packages, key=lambda item: (item.name, str(item.version))):
+        fingerprint.update(
+            json.dumps(
+                [
+                    package.name,
+                    str(package.version),
+                    package.source_type,
+                    package.source_url,
+                    package.source_resolved_reference or package.source_reference,
+                    sorted(item["hash"] for item in package.files),
+                ]
+            ).encode()
+        )
+
+    return f"{utilities.abi_tag(env)}-{fingerprint.hexdigest()[:32]}{constants.LAYER_ARCHIVE_SUFFIX}"
+
+
+def _scan(root: Path) -> Dict[str, Tuple[int, int]]:
+    """Record the size and modification time of every regular file under a directory"""
+    files: Dict[str, Tuple[int, int]] = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = Path(directory, filename)
+            info = path.lstat()
+            if stat.S_ISREG(info.st_mode):
+                files[path.relative_to(root).as_posix()] = (
+                    info.st_size,
+                    info.st_mtime_ns,
+                )
+    return files
+
+
+@contextlib.contextmanager
+def capture(archive: Optional[Path], env: "_poetry.VirtualEnv") -> Iterator[None]:
+    """Capture the files added to a virtualenv during the context as a layer
+
+    The layer is only written if the context exits without an error.
+
+    :param archive: Path to write the layer archive to, or ``None`` to disable capturing
+    :param env: Poetry virtualenv to capture the added files of
+    """
+    if archive is None:
+        yield
+        return
+
+    root = Path(env.path)
+    before = _scan(root)
+    yield
+    added = [name for name, state in _scan(root).items() if before.get(name) != state]
+
+    archive.parent.mkdir(parents=True, exist_ok=True)
+    metadata = json.dumps(
+        {
+            "python": str(env.python),
+            "scripts": Path(env.paths["scripts"]).relative_to(root).as_posix(),
+        }
+    ).encode()
+
+    # Write to a temporary file first so that concurrent environments never see a partial layer
+    descriptor, partial = tempfile.mkstemp(dir=archive.parent, suffix=".partial")
+    try:
+        with os.fdopen(descriptor, "wb") as stream, tarfile.open(
+            fileobj=stream, mode="w:gz"
+        ) as layer:
+            info = tarfile.TarInfo(constants.LAYER_METADATA_NAME)
+            info.size = len(metadata)
+            layer.addfile(info, io.BytesIO(metadata))
+            for name in sorted(added):
+                layer.add(root / name, arcname=name, recursive=False)
+        os.replace(partial, archive)
+    except BaseException:
+        os.unlink(partial)
+        raise
+
+    logger.info(f"Saved {len(added)} installed files to layer {archive}")
+
+
+def restore(archive: Path, env: "_poetry.VirtualEnv") -> bool:
+    """Restore a layer into a virtualenv
+
+    :param archive: Path to the layer archive
+    :param env: Poetry virtualenv to restore the layer into
+    :returns: Whether the layer was restored; ``False`` if there is no usable layer
+    """
+    if not archive.exists():
+        logger.info(f"No layer found at {archive}, installing dependencies")
+        return False
+
+    root = Path(env.path)
+    try:
+        with tarfile.open(archive, mode="r:gz") as layer:
+            metadata = json.load(layer.extractfile(constants.LAYER_METADATA_NAME))  # type: ignore
+            members = [
+                member
+                for member in layer.getmembers()
+                if member.name != constants.LAYER_METADATA_NAME
+            ]
+            for member in members:
+                path = PurePosixPath(member.name)
+                if not member.isfile() or path.is_absolute() or ".." in path.parts:
+                    raise tarfile.TarError(f"Unsafe layer member '{member.name}'")
+            if hasattr(tarfile, "data_filter"):
+                layer.extractall(root, members=members, filter="data")  # type: ignore
+            else:
+                layer.extractall(root, members=members)
+    except (KeyError, OSError, ValueError, tarfile.TarError) as err:
+        logger.warning(
+            f"Unable to restore layer {archive}, installing dependencies: {err}"
+        )
+        return False
+
+    python = str(env.python)
+    if metadata["python"] != python:
+        for member in members:
+            if PurePosixPath(member.name).parent.as_posix() == metadata["scripts"]:
+                _rewrite_shebang(root / member.name, metadata["python"], python)
+
+    logger.info(f"Restored {len(members)} installed files from layer {archive}")
+    return True
+
+
+def _rewrite_shebang(path: Path, old: str, new: str) -> None:
+    """Point a console script at a different interpreter"""
+    content = path.read_bytes()
+    if content.startswith(b"#!"):
+        path.write_bytes(content.replace(old.encode(), new.encode()))
@@ -3,27 +3,43 @@
 Calling ``tox.reporter.something()`` and having to format a string with the prefix
 gets really old fast, but more importantly it also makes the flow of the main code
 more difficult to follow because of the added complexity.
+
+Messages logged from hot paths, such as per-package messages during resolution and
+installation, should pass their arguments separately using ``%`` style placeholders so that
+they are only formatted if the message is actually emitted, and should check
+:func:`is_debug` before doing any work that is only needed for debug messages.
 """
 import logging
+from typing import Any
+from typing import Tuple
 
 from tox_poetry_installer import constants
 
 
-def error(message: str):
+def _log(level: int, message: str, args: Tuple[Any, ...]):
+    logging.log(level, f"{constants.REPORTER_PREFIX} {message}", *args)
+
+
+def is_debug() -> bool:
+    """Check whether debug messages will be emitted"""
+    return logging.getLogger().isEnabledFor(logging.DEBUG)
+
+
+def error(message: str, *args: Any):
     """Wrapper around :func:`logging.error` that prefixes the reporter prefix onto the message"""
-    logging.error(f"{constants.REPORTER_PREFIX} {message}")
+    _log(logging.ERROR, message, args)
 
 
-def warning(message: str):
+def warning(message: str, *args: Any):
     """Wrapper around :func:`logging.warning`"""
-    logging.warning(f"{constants.REPORTER_PREFIX} {message}")
+    _log(logging.WARNING, message, args)
 
 
-def info(message: str):
+def info(message: str, *args: Any):
     """Wrapper around :func:`logging.info`"""
-    logging.info(f"{constants.REPORTER_PREFIX} {message}")
+    _log(logging.INFO, message, args)
 
 
-def debug(message: str):
+def debug(message: str, *args: Any):
     """Wrapper around :func:`logging.debug`"""
-    logging.debug(f"{constants.REPORTER_PREFIX} {message}")
+    _log(logging.DEBUG, message, args)
@@ -0,0 +1,133 @@
+"""Opt-in profiling of the plugin's resolution and installation work
+
+Profiling is enabled with the ``--profile-dir`` runtime option. Only the code run by the plugin
+is profiled, not the rest of Tox. For each profiled stage of each environment a ``pstats`` file
+and a plain text summary of the top hotspots are written to the profile directory.
+
+.. note:: Memory tracing with :mod:`tracemalloc` is process wide, so memory snapshots taken while
+          Tox is running environments in parallel will include allocations from every
+          environment being set up at the same time.
+"""
+import contextlib
+import cProfile
+import io
+import pstats
+import threading
+import tracemalloc
+from pathlib import Path
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from tox_poetry_installer import constants
+from tox_poetry_installer import logger
+
+
+class Profiler:
+    """Collects profiles from any number of threads into a single set of stats
+
+    :param enabled: Whether profiling is enabled. A disabled profiler can be used as normal,
+                    but does not do anything.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.skipped = 0
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def thread(self) -> Iterator[None]:
+        """Profile the calling thread for the duration of the context"""
+        if not self.enabled:
+            yield
+            return
+
+        thread_profile = cProfile.Profile()
+        try:
+            thread_profile.enable()
+        except ValueError as err:
+            # Only one profiler can be active at a time from Python 3.12, so threads that run
+            # alongside a profiled thread are left out of the stats
+            logger.debug(f"Unable to profile thread {threading.get_ident()}: {err}")
+            with self._lock:
+                self.skipped += 1
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            thread_profile.disable()
+            with self._lock:
+                self._profiles.append(thread_profile)
+
+    def stats(self) -> Optional[pstats.Stats]:
+        """Combine the collected profiles
+
+        :returns: Stats combined from every profiled thread, or ``None`` if nothing was profiled
+        """
+        with self._lock:
+            profiles = list(self._profiles)
+
+        if not profiles:
+            return None
+
+        stats = pstats.Stats(profiles[0])
+        for thread_profile in profiles[1:]:
+            stats.add(thread_profile)
+        return stats
+
+
+@contextlib.contextmanager
+def profile(
+    directory: Optional[Path], name: str, trace_memory: bool = False
+) -> Iterator[Profiler]:
+    """Profile a stage of the plugin and write the results on exit
+
+    :param directory: Directory to write the profile results to, or ``None`` to disable profiling
+    :param name: Name of the profiled stage, used as the base name of the written files
+    :param trace_memory: Whether to also trace the peak memory allocated during the stage
+    :returns: Profiler that threads doing the work of the stage should be profiled with
+    """
+    profiler = Profiler(enabled=directory is not None)
+    if directory is None:
+        yield profiler
+        return
+
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    try:
+        yield profiler
+    finally:
+        directory.mkdir(parents=True, exist_ok=True)
+        summary = io.StringIO()
+        if profiler.skipped:
+            summary.write(
+                f"Work done by {profiler.skipped} threads is not included because they could not be profiled while another thread was being profiled\n"
+            )
+
+        stats = profiler.stats()
+        if stats is not None:
+            stats.dump_stats(directory / f"{name}.pstats")
+            stats.stream = summary  # type: ignore
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(
+                constants.PROFILE_SUMMARY_ENTRIES
+            )
+
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            snapshot.dump(str(directory / f"{name}.tracemalloc"))
+            summary.write(f"\nPeak traced memory: {peak / 1024:.1f} KiB\n")
+            for statistic in snapshot.statistics("lineno")[
+                : constants.PROFILE_SUMMARY_ENTRIES
+            ]:
+                summary.write(f"{statistic}\n")
+            if started_tracing:
+                tracemalloc.stop()
+
+        (directory / f"{name}.txt").write_text(summary.getvalue())
+        logger.info(f"Wrote profile of {name} to {directory}")
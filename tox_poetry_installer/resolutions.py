@@ -0,0 +1,210 @@
+"""Cache of resolved dependencies that survives changes to the lockfile
+
+Resolving the dependencies of an environment walks the lock graph from each of the
+environment's dependencies. When the lockfile changes, usually because a handful of packages
+were updated, most of those walks would find exactly the same packages as before. The cache
+keeps the packages resolved for each locked dependency of each marker environment, along with a
+fingerprint of each locked package and the dependency edges of the lock graph they were resolved
+from. When the lockfile changes, the fingerprints of the old and new lock are compared and the
+packages that changed are followed back along the old graph's edges to every package that
+depends on them. Only the resolved dependencies of those packages are discarded and resolved
+again; the rest are reused from the cache, so the cost of a lock update depends on how much of
+the lock changed rather than on the size of the lock. The cache is kept in a JSON file in the
+plugin's cache directory, with one record for each lockfile.
+"""
+# Silence this one globally to support the internal function imports for the proxied poetry module.
+# See the docstring in 'tox_poetry_installer._poetry' for more context.
+# pylint: disable=import-outside-toplevel
+import collections
+import hashlib
+import json
+import typing
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Set
+
+from tox_poetry_installer import constants
+from tox_poetry_installer import logger
+from tox_poetry_installer import utilities
+
+if typing.TYPE_CHECKING:
+    from tox_poetry_installer import _poetry
+
+
+def _fingerprints(poetry: "_poetry.Poetry") -> Dict[str, str]:
+    """Fingerprint the lockfile entries of each locked package name"""
+    from tox_poetry_installer import _poetry
+
+    entries: Dict[str, List[Any]] = collections.defaultdict(list)
+    for entry in poetry.locker.lock_data.get("package", []):
+        entries[_poetry.canonicalize_name(entry["name"])].append(entry)
+
+    return {
+        name: hashlib.sha256(
+            json.dumps(items, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        for name, items in entries.items()
+    }
+
+
+def _dependents(changed: Set[str], requires: Dict[str, List[str]]) -> Set[str]:
+    """Find every package that depends, directly or transitively, on a changed package
+
+    :param changed: Names of the packages that changed
+    :param requires: Mapping of each package name to the names of the packages it requires
+    :returns: Names of the changed packages and of every package that depends on them
+    """
+    required_by: Dict[str, List[str]] = collections.defaultdict(list)
+    for name, requirements in requires.items():
+        for requirement in requirements:
+            required_by[requirement].append(name)
+
+    affected = set(changed)
+    pending = list(changed)
+    while pending:
+        for dependent in required_by[pending.pop()]:
+            if dependent not in affected:
+                affected.add(dependent)
+                pending.append(dependent)
+    return affected
+
+
+def _record(
+    poetry: "_poetry.Poetry", packages: utilities.PackageMap, version: List[int]
+) -> Dict[str, Any]:
+    """Create an empty record for the current version of a project's lockfile
+
+    :param poetry: Poetry object for the project
+    :param packages: Mapping of all locked package names to their corresponding package object
+    :param version: Modification time and size of the lockfile
+    :returns: Record with the fingerprints and dependency edges of the lockfile's packages
+    """
+    return {
+        "project": poetry.package.name,
+        "version": version,
+        "fingerprints": _fingerprints(poetry),
+        "requires": {
+            name: sorted(
+                {
+                    requirement.name
+                    for option in options
+                    for requirement in option.requires
+                }
+            )
+            for name, options in packages.items()
+            if options
+        },
+        "closures": {},
+    }
+
+
+def _reuse(previous: Dict[str, Any], record: Dict[str, Any]) -> None:
+    """Copy the resolved dependencies that are unaffected by a lockfile change to a new record
+
+    :param previous: Record of the previous version of the lockfile
+    :param record: Record of the current version of the lockfile
+    """
+    from tox_poetry_installer import _poetry
+
+    old, new = previous["fingerprints"], record["fingerprints"]
+    changed = {
+        name for name in old.keys() | new.keys() if old.get(name) != new.get(name)
+    }
+    affected = _dependents(changed, previous["requires"])
+
+    reused = total = 0
+    for env, closures in previous["closures"].items():
+        for root, closure in closures.items():
+            total += 1
+            if _poetry.canonicalize_name(root) not in affected:
+                record["closures"].setdefault(env, {})[root] = closure
+                reused += 1
+
+    if changed:
+        logger.info(
+            "Lockfile changed: %d locked packages differ, reusing %d of %d previously resolved dependencies",
+            len(changed),
+            reused,
+            total,
+        )
+
+
+class ResolutionCache(utilities.JsonStore):
+    """Resolved dependencies of each locked dependency, kept up to date as the lockfile changes
+
+    :param path: JSON file to persist the cache to, or ``None`` to only keep it in memory
+    """
+
+    filename = constants.RESOLUTION_CACHE_FILENAME
+    description = "resolution cache"
+
+    def _merge(self, stored: Dict[str, Any]) -> Dict[str, Any]:
+        # Drop the records of lockfiles that no longer exist
+        return {
+            lockfile: record
+            for lockfile, record in stored.items()
+            if Path(lockfile).exists()
+        }
+
+    def _sync(
+        self, poetry: "_poetry.Poetry", packages: utilities.PackageMap
+    ) -> Dict[str, Any]:
+        """Retrieve the record for the current lockfile, updating it if the lockfile changed
+
+        Must be called with the lock held.
+        """
+        lockfile = str(Path(poetry.locker.lock))
+        stat = Path(lockfile).stat()
+        version = [stat.st_mtime_ns, stat.st_size]
+
+        previous = self._load().get(lockfile)
+        if previous is not None and previous.get("version") == version:
+            return previous
+
+        record = _record(poetry, packages, version)
+        if previous is not None and previous.get("project") == record["project"]:
+            _reuse(previous, record)
+
+        self._load()[lockfile] = record
+        self._updated[lockfile] = record
+        return record
+
+    def closure(
+        self,
+        root: str,
+        poetry: "_poetry.Poetry",
+        packages: utilities.PackageMap,
+        venv: "_poetry.VirtualEnv",
+        resolve: Callable[[], List["_poetry.PoetryPackage"]],
+    ) -> List["_poetry.PoetryPackage"]:
+        """Retrieve the resolved dependencies of a locked dependency, resolving them if needed
+
+        :param root: Name of the locked dependency
+        :param poetry: Poetry object for the current project
+        :param packages: Mapping of all locked package names to their corresponding package object
+        :param venv: Poetry virtual environment the dependencies are resolved for
+        :param resolve: Callable that resolves the dependencies if they are not in the cache
+        :returns: List of packages to install for the dependency
+        """
+        env = utilities.marker_env_key(venv)
+        with self._lock:
+            cached = self._sync(poetry, packages)["closures"].get(env, {}).get(root)
+
+        if cached is not None:
+            try:
+                return [packages[name][index] for name, index in cached]
+            except (IndexError, KeyError, TypeError, ValueError):
+                logger.debug("Ignoring invalid cached dependencies of %s", root)
+
+        closure = resolve()
+        entry = [
+            [package.name, packages[package.name].index(package)] for package in closure
+        ]
+        with self._lock:
+            record = self._sync(poetry, packages)
+            record["closures"].setdefault(env, {})[root] = entry
+            self._updated[str(Path(poetry.locker.lock))] = record
+        return closure
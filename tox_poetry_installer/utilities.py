@@ -3,15 +3,28 @@
 # See the docstring in 'tox_poetry_installer._poetry' for more context.
 # pylint: disable=import-outside-toplevel
 import collections
+import contextlib
+import functools
+import json
+import os
+import tempfile
+import threading
 import typing
 from pathlib import Path
+from typing import Callable
 from typing import Dict
+from typing import Iterator
 from typing import List
+from typing import NamedTuple
+from typing import Optional
 from typing import Sequence
 from typing import Set
+from typing import Tuple
 
 from poetry.core.packages.dependency import Dependency as PoetryDependency
 from poetry.core.packages.package import Package as PoetryPackage
+from poetry.core.utils.helpers import canonicalize_name
+from poetry.core.version.markers import BaseMarker
 from tox.tox_env.api import ToxEnv as ToxVirtualEnv
 from tox.tox_env.package import PackageToxEnv
 
@@ -20,11 +33,47 @@ from tox_poetry_installer import exceptions
 from tox_poetry_installer import logger
 
 if typing.TYPE_CHECKING:
+    from typing_extensions import Protocol
+
     from tox_poetry_installer import _poetry
+    from tox_poetry_installer import resolutions
+
+    class InstallEnv(Protocol):
+        """Environment to install locked dependencies to
+
+        Either a Tox environment, or the install daemon's stand-in for one.
+        """
+
+        @property
+        def name(self) -> str:
+            """Name of the environment"""
+
+        @property
+        def env_dir(self) -> Path:
+            """Path to the environment's virtualenv"""
 
 
 PackageMap = Dict[str, List[PoetryPackage]]
 
+# Memo of resolved dependency closures, keyed by the lockfile, the marker environment the
+# closure was resolved for, and the name of the closure root. Tox may run environments in
+# parallel threads so all access goes through the lock.
+_CLOSURES: Dict[Tuple[Tuple[str, int, int], str, str], List[PoetryPackage]] = {}
+_CLOSURES_LOCK = threading.Lock()
+
+# Version of each lockfile that the memoized closures were resolved from. Only closures of the
+# latest version of each lockfile are kept, so a long running process such as the install
+# daemon does not accumulate the closures of every version of a lockfile it has seen.
+_CLOSURE_LOCKFILES: Dict[str, Tuple[int, int]] = {}
+
+# Whether locked packages are compatible with each marker environment, keyed by the marker
+# environment and then by the marker and Python versions of the package. Many locked packages
+# share the same marker and Python versions, and environments for the same interpreter share a
+# marker environment, so each distinct combination only needs to be checked once for each
+# interpreter rather than once for each package of each environment.
+_MARKER_RESULTS: Dict[str, Dict[Tuple[BaseMarker, str], bool]] = {}
+_MARKER_RESULTS_LOCK = threading.Lock()
+
 
 def check_preconditions(venv: ToxVirtualEnv) -> "_poetry.Poetry":
     """Check that the local project environment meets expectations"""
@@ -44,10 +93,19 @@ def check_preconditions(venv: ToxVirtualEnv) -> "_poetry.Poetry":
             "set the 'require_poetry = true' option in tox.ini"
         )
 
+    return load_poetry(venv.core["tox_root"])
+
+
+def load_poetry(root: Path) -> "_poetry.Poetry":
+    """Load the Poetry project for a Tox project
+
+    :param root: Root directory of the Tox project
+    :returns: Poetry object for the project in the root directory
+    """
     from tox_poetry_installer import _poetry
 
     try:
-        return _poetry.Factory().create_poetry(venv.core["tox_root"])
+        return _poetry.Factory().create_poetry(root)
     # Support running the plugin when the current tox project does not use Poetry for its
     # environment/dependency management.
     #
@@ -59,7 +117,7 @@ def check_preconditions(venv: ToxVirtualEnv) -> "_poetry.Poetry":
         ) from None
 
 
-def convert_virtualenv(venv: ToxVirtualEnv) -> "_poetry.VirtualEnv":
+def convert_virtualenv(venv: "InstallEnv") -> "_poetry.VirtualEnv":
     """Convert a Tox venv to a Poetry venv
 
     :param venv: Tox ``VirtualEnv`` object representing a tox virtual environment
@@ -70,17 +128,143 @@ def convert_virtualenv(venv: ToxVirtualEnv) -> "_poetry.VirtualEnv":
     return _poetry.VirtualEnv(path=Path(venv.env_dir))
 
 
+def cache_dir() -> Path:
+    """Directory for the plugin's persistent caches, inside the Poetry cache directory"""
+    from tox_poetry_installer import _poetry
+
+    return Path(_poetry.Config().get("cache-dir")) / constants.CACHE_DIR_NAME
+
+
+def abi_tag(env: "_poetry.VirtualEnv") -> str:
+    """Identify the interpreter ABI and platform of a virtualenv
+
+    :param env: Poetry virtualenv to identify
+    :returns: Tag such as ``cp-3_11-linux-x86_64`` identifying where built packages are valid
+    """
+    return "-".join(
+        str(env.marker_env.get(key, "any")).replace("-", "_")
+        for key in (
+            "interpreter_name",
+            "interpreter_version",
+            "sys_platform",
+            "platform_machine",
+        )
+    )
+
+
+def dump_json(path: Path, data: typing.Any) -> None:
+    """Atomically write JSON data to a file, so that readers never see a partial file
+
+    :param path: File to write the data to. Missing parent directories are created.
+    :param data: JSON serializable data to write
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, partial = tempfile.mkstemp(dir=path.parent, suffix=".partial")
+    try:
+        with os.fdopen(descriptor, "w") as stream:
+            json.dump(data, stream)
+        os.replace(partial, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(partial)
+        raise
+
+
+_Store = typing.TypeVar("_Store", bound="JsonStore")
+
+# Instance of each JSON store class shared by every environment in the current process
+_SHARED_STORES: Dict[type, "JsonStore"] = {}
+_SHARED_STORES_LOCK = threading.Lock()
+
+
+class JsonStore:
+    """Base for the plugin's caches that are kept in a JSON file in the plugin's cache directory
+
+    The entries of the file are read the first time they are needed. Entries that are updated
+    are written back by :meth:`save`, which merges them into the file as it is on disk at the
+    time, so that concurrent Tox runs sharing the cache directory do not discard each other's
+    entries. Subclasses implement the logic of their entries on top of :meth:`_load` and
+    :attr:`_updated`, holding :attr:`_lock` while they use either.
+
+    :param path: JSON file to persist the entries to, or ``None`` to only keep them in memory
+    """
+
+    #: Name of the file in the plugin's cache directory that the shared instance is kept in
+    filename = ""
+
+    #: Description of the store used in log messages
+    description = "cache"
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._entries: Optional[Dict[str, typing.Any]] = None
+        self._updated: Dict[str, typing.Any] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls: typing.Type[_Store]) -> _Store:
+        """Retrieve the instance shared by every environment in the current process"""
+        with _SHARED_STORES_LOCK:
+            store = _SHARED_STORES.get(cls)
+            if store is None:
+                store = _SHARED_STORES[cls] = cls(cache_dir() / cls.filename)
+        return typing.cast(_Store, store)
+
+    def _load(self) -> Dict[str, typing.Any]:
+        """Retrieve the entries, reading them from the file if they have not been read yet"""
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries
+
+    def _read(self) -> Dict[str, typing.Any]:
+        if self.path is None:
+            return {}
+        try:
+            return json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as err:
+            logger.debug(f"Ignoring unreadable {self.description} {self.path}: {err}")
+            return {}
+
+    def _merge(self, stored: Dict[str, typing.Any]) -> Dict[str, typing.Any]:
+        """Select the entries on disk that are kept when the updated entries are saved
+
+        :param stored: Entries currently in the file
+        :returns: Entries to save along with the updated entries
+        """
+        return stored
+
+    def save(self) -> None:
+        """Write the entries updated since the last save to the file"""
+        with self._lock:
+            if self.path is None or not self._updated:
+                return
+
+            # Merge with the file on disk in case another process updated it since it was read
+            entries = self._merge(self._read())
+            entries.update(self._updated)
+            self._entries = entries
+            self._updated = {}
+            try:
+                dump_json(self.path, entries)
+            except OSError as err:
+                logger.debug(f"Unable to save {self.description} {self.path}: {err}")
+
+
 def build_package_map(poetry: "_poetry.Poetry") -> PackageMap:
     """Build the mapping of package names to objects
 
     :param poetry: Populated poetry object to load locked packages from
-    :returns: Mapping of package names to Poetry package objects
+    :returns: Mapping of package names to Poetry package objects. The mapping is a plain
+              ``dict`` so that looking up a name that is not locked never modifies it, which
+              lets threads resolving different environments share one mapping.
     """
-    packages = collections.defaultdict(list)
+    packages: Dict[str, List[PoetryPackage]] = collections.defaultdict(list)
     for package in poetry.locker.locked_repository().packages:
         packages[package.name].append(package)
 
-    return packages
+    return dict(packages)
 
 
 def identify_transients(
@@ -92,7 +276,8 @@ def identify_transients(
     """Using a pool of packages, identify all transient dependencies of a given package name
 
     :param dep_name: Either the Poetry dependency or the dependency's bare package name to recursively
-                     identify the transient dependencies of
+                     identify the transient dependencies of. The name does not need to be
+                     normalized.
     :param packages: All packages from the lockfile to use for identifying dependency relationships.
     :param venv: Poetry virtual environment to use for package compatibility checks
     :param allow_missing: Sequence of package names to allow to be missing from the lockfile. Any
@@ -105,105 +290,114 @@ def identify_transients(
     """
     searched: Set[str] = set()
 
+    def _version() -> str:
+        return ".".join([str(item) for item in venv.get_version_info()])
+
     def _transients(transient: PoetryDependency) -> List[PoetryPackage]:
         searched.add(transient.name)
 
         results: List[PoetryPackage] = []
-        for option in packages[transient.name]:
-            if venv.is_valid_for_marker(option.to_dependency().marker):
+        for option in packages.get(transient.name, []):
+            if compatible(option):
                 for requirement in option.requires:
                     if requirement.name not in searched:
                         results += _transients(requirement)
-                logger.debug(f"Including {option} for installation")
+                logger.debug("Including %s for installation", option)
                 results.append(option)
                 break
         else:
-            logger.debug(
-                f"Skipping {transient.name}: target python version is {'.'.join([str(item) for item in venv.get_version_info()])} but package requires {transient.marker}"
-            )
+            if logger.is_debug():
+                logger.debug(
+                    "Skipping %s: target python version is %s but package requires %s",
+                    transient.name,
+                    _version(),
+                    transient.marker,
+                )
 
         return results
 
-    try:
-        for option in packages[dep_name]:
-            if venv.is_valid_for_marker(option.to_dependency().marker):
-                dep = option.to_dependency()
-                break
-        else:
-            logger.warning(
-                f"Skipping {dep_name}: no locked version found compatible with target python version {'.'.join([str(item) for item in venv.get_version_info()])}"
-            )
-            return []
+    name = canonicalize_name(dep_name)
+    options = packages.get(name)
 
-        return _transients(dep)
-    except KeyError as err:
-        missing = err.args[0]
-
-        if missing in constants.UNSAFE_PACKAGES:
+    if not options:
+        if name in constants.UNSAFE_PACKAGES:
             logger.warning(
-                f"Installing package '{missing}' using Poetry is not supported and will be skipped"
+                f"Installing package '{name}' using Poetry is not supported and will be skipped"
             )
-            logger.debug(f"Skipping {missing}: designated unsafe by Poetry")
+            logger.debug(f"Skipping {name}: designated unsafe by Poetry")
             return []
 
-        if missing in allow_missing:
-            logger.debug(f"Skipping {missing}: package is allowed to be unlocked")
+        if name in allow_missing:
+            logger.debug(f"Skipping {name}: package is allowed to be unlocked")
             return []
 
-        if any(
-            delimiter in missing for delimiter in constants.PEP508_VERSION_DELIMITERS
-        ):
-            raise exceptions.LockedDepVersionConflictError(
-                f"Locked dependency '{missing}' cannot include version specifier"
-            ) from None
+        raise _missing_dep_error(dep_name)
 
-        raise exceptions.LockedDepNotFoundError(
-            f"No version of locked dependency '{missing}' found in the project lockfile"
-        ) from None
+    compatible = compatibility_check(venv)
+    for option in options:
+        if compatible(option):
+            return _transients(option.to_dependency())
 
+    logger.warning(
+        f"Skipping {dep_name}: no locked version found compatible with target python version {_version()}"
+    )
+    return []
 
-def find_project_deps(
-    packages: PackageMap,
-    venv: "_poetry.VirtualEnv",
-    poetry: "_poetry.Poetry",
-    extras: Sequence[str] = (),
-) -> List[PoetryPackage]:
-    """Find the root project dependencies
 
-    Recursively identify the dependencies of the root project package
+def _missing_dep_error(dep_name: str) -> exceptions.ToxPoetryInstallerException:
+    """Build the error for a dependency that is not in the lockfile"""
+    if any(delimiter in dep_name for delimiter in constants.PEP508_VERSION_DELIMITERS):
+        return exceptions.LockedDepVersionConflictError(
+            f"Locked dependency '{dep_name}' cannot include version specifier"
+        )
+    return exceptions.LockedDepNotFoundError(
+        f"No version of locked dependency '{dep_name}' found in the project lockfile"
+    )
 
+
+def check_locked(
+    dep_names: Sequence[str],
+    packages: PackageMap,
+    allow_missing: Sequence[str] = (),
+) -> None:
+    """Check that dependencies can be found in the lockfile, without resolving them
+
+    :param dep_names: Names of the dependencies to check. The names do not need to be normalized.
     :param packages: Mapping of all locked package names to their corresponding package object
-    :param venv: Poetry virtual environment to use for package compatibility checks
+    :param allow_missing: Sequence of package names to allow to be missing from the lockfile
+    :raises LockedDepVersionConflictError: If a dependency name includes a version specifier
+    :raises LockedDepNotFoundError: If a dependency is not in the lockfile
+    """
+    for dep_name in dep_names:
+        name = canonicalize_name(dep_name)
+        if (
+            not packages.get(name)
+            and name not in constants.UNSAFE_PACKAGES
+            and name not in allow_missing
+        ):
+            raise _missing_dep_error(dep_name)
+
+
+def check_project(poetry: "_poetry.Poetry", extras: Sequence[str] = ()) -> List[str]:
+    """Check that the dependencies of the root project package can be installed
+
     :param poetry: Poetry object for the current project
     :param extras: Sequence of extra names to include the dependencies of
+    :returns: Names of the required dependencies of the root project package
     """
-
     if any(dep.name in constants.UNSAFE_PACKAGES for dep in poetry.package.requires):
         raise exceptions.RequiresUnsafeDepError(
             f"Project package requires one or more unsafe dependencies ({', '.join(constants.UNSAFE_PACKAGES)}) which cannot be installed with Poetry"
         )
 
-    required_dep_names = [
-        item.name for item in poetry.package.requires if not item.is_optional()
-    ]
-
-    extra_dep_names: List[str] = []
     for extra in extras:
         logger.info(f"Processing project extra '{extra}'")
-        try:
-            extra_dep_names += [item.name for item in poetry.package.extras[extra]]
-        except KeyError:
+        if extra not in poetry.package.extras:
             raise exceptions.ExtraNotFoundError(
                 f"Environment specifies project extra '{extra}' which was not found in the lockfile"
-            ) from None
-
-    dependencies: List[PoetryPackage] = []
-    for dep_name in required_dep_names + extra_dep_names:
-        dependencies += identify_transients(
-            dep_name.lower(), packages, venv, allow_missing=[poetry.package.name]
-        )
+            )
 
-    return dedupe_packages(dependencies)
+    return [item.name for item in poetry.package.requires if not item.is_optional()]
 
 
 def find_additional_deps(
@@ -222,13 +416,185 @@ def find_additional_deps(
     :param dep_names: Sequence of additional dependency names to recursively find the transient
                       dependencies for
     """
-    dependencies: List[PoetryPackage] = []
+    return dedupe_packages(
+        list(iter_additional_deps(packages, venv, poetry, dep_names))
+    )
+
+
+def iter_additional_deps(
+    packages: PackageMap,
+    venv: "_poetry.VirtualEnv",
+    poetry: "_poetry.Poetry",
+    dep_names: Sequence[str],
+    cache: Optional["resolutions.ResolutionCache"] = None,
+) -> Iterator[PoetryPackage]:
+    """Lazily identify the dependencies of an arbitrary list of package names
+
+    The dependencies of each name are yielded as soon as they are resolved, leaves first. A
+    package required by several of the names is yielded once for each of them.
+
+    :param packages: Mapping of all locked package names to their corresponding package object
+    :param venv: Poetry virtual environment to use for package compatibility checks
+    :param poetry: Poetry object for the current project
+    :param dep_names: Sequence of additional dependency names to recursively find the transient
+                      dependencies for
+    :param cache: Optional cache of the dependencies resolved from previous versions of the
+                  lockfile, to reuse any that the current lockfile has not changed
+    """
+
+    def _resolve(dep_name: str) -> List[PoetryPackage]:
+        resolve = functools.partial(
+            identify_transients,
+            dep_name,
+            packages,
+            venv,
+            allow_missing=[poetry.package.name],
+        )
+        if cache is None:
+            return resolve()
+        return cache.closure(dep_name, poetry, packages, venv, resolve)
+
     for dep_name in dep_names:
-        dependencies += identify_transients(
-            dep_name.lower(), packages, venv, allow_missing=[poetry.package.name]
+        name = canonicalize_name(dep_name)
+        yield from memoize_closure(
+            f"dep:{name}", poetry, venv, functools.partial(_resolve, name)
+        )
+
+
+def _group_dep_names(poetry: "_poetry.Poetry", group: str) -> List[str]:
+    """Retrieve the names of the dependencies listed in a dependency group"""
+    return list(
+        poetry.pyproject.data["tool"]["poetry"]
+        .get("group", {})
+        .get(group, {})
+        .get("dependencies", {})
+        .keys()
+    )
+
+
+class EnvDeps(NamedTuple):
+    """Locked dependencies that a test environment asks to install
+
+    :param groups: Names of the dependency groups to install
+    :param dep_names: Names of the additional locked dependencies to install
+    :param extras: Sequence of project extra names to include the dependencies of
+    :param install_project_deps: Whether to include the dependencies of the project package
+    """
+
+    groups: Sequence[str] = ()
+    dep_names: Sequence[str] = ()
+    extras: Sequence[str] = ()
+    install_project_deps: bool = True
+
+
+def find_env_deps(
+    packages: PackageMap,
+    venv: "_poetry.VirtualEnv",
+    poetry: "_poetry.Poetry",
+    env_deps: EnvDeps,
+    cache: Optional["resolutions.ResolutionCache"] = None,
+) -> List[PoetryPackage]:
+    """Find every locked dependency to install to a test environment
+
+    :param packages: Mapping of all locked package names to their corresponding package object
+    :param venv: Poetry virtual environment to use for package compatibility checks
+    :param poetry: Poetry object for the current project
+    :param env_deps: Locked dependencies that the environment asks to install
+    :param cache: Optional cache of the dependencies resolved from previous versions of the
+                  lockfile, to reuse any that the current lockfile has not changed. The cache
+                  is saved once every dependency is resolved.
+    """
+    return list(iter_env_deps(packages, venv, poetry, env_deps, cache))
+
+
+def iter_env_deps(
+    packages: PackageMap,
+    venv: "_poetry.VirtualEnv",
+    poetry: "_poetry.Poetry",
+    env_deps: EnvDeps,
+    cache: Optional["resolutions.ResolutionCache"] = None,
+) -> Iterator[PoetryPackage]:
+    """Lazily find every locked dependency to install to a test environment
+
+    The project and the names of the dependencies to install are checked before this function
+    returns, so that configuration errors are raised immediately rather than part way through
+    installing. The packages are then resolved one dependency at a time as the returned
+    iterator is consumed: each package is yielded leaves first as soon as it is resolved, and
+    only the first time it is found.
+
+    Parameters are the same as for :func:`find_env_deps`.
+    """
+    stages = [
+        (
+            "group",
+            [
+                name
+                for group in env_deps.groups
+                for name in _group_dep_names(poetry, group)
+            ],
+        ),
+        ("environment", list(env_deps.dep_names)),
+    ]
+    if env_deps.install_project_deps:
+        stages.append(
+            (
+                "project",
+                check_project(poetry, env_deps.extras)
+                + [
+                    item.name
+                    for extra in env_deps.extras
+                    for item in poetry.package.extras[extra]
+                ],
+            )
         )
 
-    return dedupe_packages(dependencies)
+    check_locked(
+        [root for _, roots in stages for root in roots],
+        packages,
+        allow_missing=[poetry.package.name],
+    )
+
+    def _resolve() -> Iterator[PoetryPackage]:
+        seen: Set[PoetryPackage] = set()
+        for stage, roots in stages:
+            found: Set[PoetryPackage] = set()
+            for package in iter_additional_deps(packages, venv, poetry, roots, cache):
+                found.add(package)
+                if package not in seen:
+                    seen.add(package)
+                    yield package
+            logger.info(
+                f"Identified {len(found)} {stage} dependencies to install to env"
+            )
+
+        if not env_deps.install_project_deps:
+            logger.info("Env does not install project package dependencies, skipping")
+
+        if cache is not None:
+            cache.save()
+
+    return _resolve()
+
+
+def find_project_deps(
+    packages: PackageMap,
+    venv: "_poetry.VirtualEnv",
+    poetry: "_poetry.Poetry",
+    extras: Sequence[str] = (),
+) -> List[PoetryPackage]:
+    """Find the root project dependencies
+
+    Recursively identify the dependencies of the root project package
+
+    .. note:: Kept for compatibility, :func:`find_env_deps` finds every dependency of an
+              environment in one call.
+
+    :param packages: Mapping of all locked package names to their corresponding package object
+    :param venv: Poetry virtual environment to use for package compatibility checks
+    :param poetry: Poetry object for the current project
+    :param extras: Sequence of extra names to include the dependencies of
+    """
+    return find_env_deps(packages, venv, poetry, EnvDeps(extras=extras))
 
 
 def find_group_deps(
@@ -239,22 +605,16 @@ def find_group_deps(
 ) -> List[PoetryPackage]:
     """Find the dependencies belonging to a dependency group
 
-    Recursively identify the Poetry dev dependencies
+    .. note:: Kept for compatibility, :func:`find_env_deps` finds every dependency of an
+              environment in one call.
 
     :param group: Name of the dependency group from the project's ``pyproject.toml``
     :param packages: Mapping of all locked package names to their corresponding package object
     :param venv: Poetry virtual environment to use for package compatibility checks
     :param poetry: Poetry object for the current project
     """
-    return find_additional_deps(
-        packages,
-        venv,
-        poetry,
-        poetry.pyproject.data["tool"]["poetry"]
-        .get("group", {})
-        .get(group, {})
-        .get("dependencies", {})
-        .keys(),
+    return find_env_deps(
+        packages, venv, poetry, EnvDeps(groups=[group], install_project_deps=False)
     )
 
 
@@ -265,22 +625,108 @@ def find_dev_deps(
 
     Recursively identify the Poetry dev dependencies
 
+    .. note:: Kept for compatibility, :func:`find_env_deps` finds every dependency of an
+              environment in one call.
+
     :param packages: Mapping of all locked package names to their corresponding package object
     :param venv: Poetry virtual environment to use for package compatibility checks
     :param poetry: Poetry object for the current project
     """
-    dev_group_deps = find_group_deps("dev", packages, venv, poetry)
-
-    # Legacy pyproject.toml poetry format:
-    legacy_dev_group_deps = find_additional_deps(
+    # Poetry 1.2 unions the dev group with the legacy ``dev-dependencies`` section
+    return find_env_deps(
         packages,
         venv,
         poetry,
-        poetry.pyproject.data["tool"]["poetry"].get("dev-dependencies", {}).keys(),
+        EnvDeps(
+            groups=["dev"],
+            dep_names=list(
+                poetry.pyproject.data["tool"]["poetry"].get("dev-dependencies", {})
+            ),
+            install_project_deps=False,
+        ),
     )
 
-    # Poetry 1.2 unions these two toml sections.
-    return dedupe_packages(dev_group_deps + legacy_dev_group_deps)
+
+def memoize_closure(
+    root: str,
+    poetry: "_poetry.Poetry",
+    venv: "_poetry.VirtualEnv",
+    resolve: Callable[[], List[PoetryPackage]],
+) -> List[PoetryPackage]:
+    """Resolve a dependency closure at most once per lockfile and marker environment
+
+    :param root: Unique name of the closure root, such as ``dep:<name>`` for a dependency
+    :param poetry: Poetry object for the current project
+    :param venv: Poetry virtual environment the closure is resolved for
+    :param resolve: Callable that resolves the closure if it has not already been memoized
+    :returns: List of packages in the closure. The list is a copy and may be modified by the caller.
+    """
+    lockfile = str(Path(poetry.locker.lock))
+    stat = Path(lockfile).stat()
+    version = (stat.st_mtime_ns, stat.st_size)
+    key = ((lockfile, *version), marker_env_key(venv), root)
+
+    with _CLOSURES_LOCK:
+        if _CLOSURE_LOCKFILES.get(lockfile) != version:
+            for stale in [item for item in _CLOSURES if item[0][0] == lockfile]:
+                del _CLOSURES[stale]
+            _CLOSURE_LOCKFILES[lockfile] = version
+        closure = _CLOSURES.get(key)
+
+    if closure is None:
+        closure = resolve()
+        with _CLOSURES_LOCK:
+            # Not memoized if the lockfile changed again while the closure was resolved
+            if _CLOSURE_LOCKFILES.get(lockfile) == version:
+                closure = _CLOSURES.setdefault(key, closure)
+    else:
+        logger.debug("Reusing resolved dependencies of %s", root)
+
+    return list(closure)
+
+
+def marker_env_key(venv: "_poetry.VirtualEnv") -> str:
+    """Serialize the marker environment of a virtualenv for use as a lookup key"""
+    return json.dumps(venv.marker_env, sort_keys=True, default=str)
+
+
+def compatibility_check(
+    venv: "_poetry.VirtualEnv",
+) -> Callable[[PoetryPackage], bool]:
+    """Build a check of whether locked packages can be installed to a virtualenv
+
+    The result for each distinct package marker and Python versions is shared with every other
+    virtualenv that has the same marker environment, in this and later calls.
+
+    :param venv: Poetry virtual environment to check packages against
+    :returns: Function that checks whether a locked package is compatible with the virtualenv
+    """
+    with _MARKER_RESULTS_LOCK:
+        results = _MARKER_RESULTS.setdefault(marker_env_key(venv), {})
+
+    def _compatible(package: PoetryPackage) -> bool:
+        key = (package.marker, package.python_versions)
+        # Threads checking the same new key at once may both evaluate it, but always store the
+        # same result, so the results are read and written without holding the lock
+        compatible = results.get(key)
+        if compatible is None:
+            # Building the dependency combines the marker with the Python versions, which is
+            # the slow part of the check
+            compatible = results[key] = venv.is_valid_for_marker(
+                package.to_dependency().marker
+            )
+        return compatible
+
+    return _compatible
+
+
+def clear_closure_memo() -> None:
+    """Discard every memoized dependency closure and marker result"""
+    with _CLOSURES_LOCK:
+        _CLOSURES.clear()
+        _CLOSURE_LOCKFILES.clear()
+    with _MARKER_RESULTS_LOCK:
+        _MARKER_RESULTS.clear()
 
 
 def dedupe_packages(packages: Sequence[PoetryPackage]) -> List[PoetryPackage]: